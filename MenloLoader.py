@@ -1,30 +1,214 @@
 
-import pandas as pd
-import csv
+import io
+import re
 import numpy as np
 import datetime
-from scipy import signal as sgnl
-from sklearn.linear_model import LinearRegression
 import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PhiScanProfiler import profiler
+
+
+N_HEADER = 5                # lines before the numeric block of a Menlo TDS file
+TIMESTAMP = re.compile(r'^#.*Timestamp[:\s]*([^,\r\n]*)', re.M)
+
+
+class MenloFileError(ValueError):
+
+    """Raised for Menlo TDS files that cannot be parsed.
+
+        *Attributes*
+
+        path : file that failed
+        reason : short description of the problem
+    """
+
+    def __init__(self, path, reason):
+        super().__init__(f"{path}: {reason}")
+        self.path = path
+        self.reason = reason
+
+    def __reduce__(self):
+        return (MenloFileError, (self.path, self.reason))
+
+
+@profiler.timed('read_menlo')
+def read_menlo(path, data = True):
+
+    """Read a Menlo TDS text file in a single pass.
+        
+        *Arguments*
+
+        path : path of the .txt file
+        data : parse the numeric block, otherwise only the header metadata
+
+        *Returns*
+
+        dict with 'Datetime', the header lines and, if data is set, the 'time'
+        axis starting at 0 and the 'amp' trace as numpy arrays.
+
+        *Raises*
+
+        MenloFileError if the file is truncated, has no timestamp or a 
+        malformed numeric block.
+    """
+
+    try:
+        with open(path) as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        raise MenloFileError(path, f"unreadable ({e})") from e
+    lines = text.split('\n', N_HEADER)
+    if len(lines) <= N_HEADER:
+        raise MenloFileError(path, f"fewer than {N_HEADER} header lines")
+    stamp = TIMESTAMP.search(text)
+    if stamp is None:
+        raise MenloFileError(path, "no Timestamp header")
+    res = {'header': lines[:N_HEADER], 'Datetime': parse_timestamp(path, stamp.group(1))}
+    if data:
+        import pandas as pd
+        try:
+            block = pd.read_csv(io.StringIO(lines[N_HEADER]), sep = '\t', header = None,
+                                usecols = [0, 1], comment = '#', dtype = float).to_numpy()
+        except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            raise MenloFileError(path, f"malformed data block ({e})") from e
+        res['time'] = block[:, 0] - block[0, 0]
+        res['amp'] = block[:, 1]
+    return res
+
+
+def parse_timestamp(path, stamp):
+
+    """Datetime of a header timestamp, with either a 2 (non-wafer) or 4 (wafer) digit year"""
+
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(stamp.strip(), fmt)
+        except ValueError:
+            pass
+    raise MenloFileError(path, f"unknown timestamp format '{stamp.strip()}'")
+
+
+def nearest_sorted(axis, value):
+
+    """Index of the element of an ascending axis closest to value.
+
+        Binary search equivalent of MenloLoader.find_nearest, ties go to the
+        lower index as with argmin.
+    """
+
+    i = int(np.searchsorted(axis, value))
+    if i == len(axis) or (i > 0 and value - axis[i-1] <= axis[i] - value):
+        # first of any repeated values, as argmin
+        i = int(np.searchsorted(axis, axis[i-1]))
+    return i
+
+
+class SpectralPlan():
+
+    """Window, frequency axis and band indices shared by every trace with the same sampling.
+
+        Built once per (N, dt, t_ser_len, tukey_alpha, band, store_band) by
+        spectral_plan. start and stop index the 'phase' band in the positive
+        half spectrum, keep the stored bins of it.
+    """
+
+    __slots__ = ('N', 'dt', 't_ser_len', 'window', 'n_bins', 'freq', 'keep', 'start', 'stop', 'p_freq')
+
+    def __init__(self, N, dt, t_ser_len, tukey_alpha, band, store_band = None):
+
+        self.N = N
+        self.dt = dt
+        self.t_ser_len = t_ser_len
+        from scipy.signal import windows        # slow to import, only needed once data arrives
+        self.window = windows.tukey(N, alpha = tukey_alpha)
+        # positive half from 0 Hz, without Nyquist
+        self.n_bins = int(t_ser_len/2)
+        freq = np.fft.rfftfreq(t_ser_len, dt)[:self.n_bins]
+        for arr in (self.window, freq):
+            arr.flags.writeable = False
+        self.start = nearest_sorted(freq, band[0])
+        self.stop = nearest_sorted(freq, band[1])
+        self.p_freq = freq[self.start:self.stop]
+        if store_band is None:
+            self.keep = slice(0, self.n_bins)
+        else:
+            self.keep = slice(nearest_sorted(freq, store_band[0]), nearest_sorted(freq, store_band[1]) + 1)
+        self.freq = freq[self.keep]
+
+
+@lru_cache(maxsize = 32)
+def spectral_plan(N, dt, t_ser_len, tukey_alpha, band, store_band = None):
+
+    """Shared SpectralPlan of a sampling setup"""
+
+    return SpectralPlan(N, dt, t_ser_len, tukey_alpha, band, store_band)
+
+
+_worker_loader = None
+
+
+def _read_menlo_worker(path, params):
+
+    """Process pool job of MenloLoader.iter_Menlo: parse a file and optionally transform it"""
+
+    global _worker_loader
+    res = read_menlo(path)
+    if params is not None:
+        if _worker_loader is None or _worker_loader.processing_params() != params:
+            _worker_loader = MenloLoader([])
+            _worker_loader.set_processing_params(params)
+        res.update(_worker_loader.get_FD_batch(res['time'], res['amp']))
+    return res
+
 
 class MenloLoader:
 
     def __init__(self, src_flist, config = None):
 
-        self.src_flist = src_flist
+        self.src_flist = list(src_flist)
         self.win = 400
         self.config = config
+        # Spectral processing parameters shared by every trace
+        self.t_ser_len = 16384          # zero-padded length of the time series
+        self.resolution = None          # THz, if set the pad length is chosen to reach it instead
+        self.tukey_alpha = 0.1
+        self.band = (0.2, 2)            # THz limits of the 'phase' / 'slc_FFT' slices
+        self.precision = 'double'       # 'single' stores spectra as float32 / complex64
+        self.store_band = None          # THz limits of the stored 'freq' / 'FFT' / 'c_FFT', all bins if None
+        self.errors = []                # MenloFileError of files skipped while loading
         #self.src_flist, self.src_TDS, self.dtlist = self.File_Loader_Menlo(self.src_flist)
         self.src_TDS, self.dtlist = self.FileLoader(self.src_flist)
-        self.data = self.get_data2(self.src_flist, self.src_TDS, self.dtlist)
-        FD = pd.DataFrame()
-        for i in range(len(self.data)):
-            FD = pd.concat([FD,self.get_FD(self.data.loc[i]['time'],
-                                            self.data.loc[i]['amp'])],
-                                            axis = 0).reset_index(drop = True)
-        self.data = pd.concat([FD, self.data], axis = 1) 
-
+        self.data = None                # dataframe of the files, an empty loader imports no pandas
+        if self.src_flist:
+            import pandas as pd
+            self.data = self.get_data2(self.src_flist, self.src_TDS, self.dtlist)
+            FD = self.get_FD_rows(list(self.data['time']), list(self.data['amp']))
+            self.data = pd.concat([FD, self.data], axis = 1) 
+            profiler.snapshot('menlo_loaded')
   
+    def processing_params(self):
+
+        """Parameters that determine the spectra computed from a trace"""
+
+        return {'t_ser_len': self.t_ser_len, 'resolution': self.resolution,
+                'tukey_alpha': self.tukey_alpha, 'band': list(self.band),
+                'store_band': None if self.store_band is None else list(self.store_band),
+                'precision': self.precision}
+
+
+    def set_processing_params(self, params):
+
+        """Restore parameters returned by processing_params"""
+
+        self.t_ser_len = params['t_ser_len']
+        self.resolution = params['resolution']
+        self.tukey_alpha = params['tukey_alpha']
+        self.band = tuple(params['band'])
+        self.store_band = None if params['store_band'] is None else tuple(params['store_band'])
+        self.precision = params['precision']
+
+
     def find_nearest(self,array, value):  
 
         array = np.asarray(array)
@@ -45,80 +229,180 @@ class MenloLoader:
 
             df: Dataframe object with unwrapped phase
         """
-        freq_lst = []
-        phase_lst = []
-        for i in range(len(df)) :
-            phase = df.loc[i]['%s'%key]
-            p_freq = df.loc[i]['p_freq']
-            for k in range(1):
-                for m in range(1,len(phase)):
-                    diff = phase[m] - phase[m-1]
-                    if diff > np.pi:
-                        phase[m:] = phase[m:] - 2*np.pi
-                    elif diff < -np.pi:
-                        phase[m:] = phase[m:] + 2*np.pi                        
-            x0 = self.find_nearest(p_freq,0.1)
-            x1 = self.find_nearest(p_freq,0.3)
-            ex_freq = p_freq[x0[0]:x1[0]].reshape((-1,1))
-            ex_phase = phase[x0[0]:x1[0]]
-            model = LinearRegression().fit(ex_freq,ex_phase)
-            #r_sq = model.score(ex_freq,ex_phase)
-            offset = model.intercept_
-            phase = phase[x0[0]:] - offset
-            p_freq = p_freq[x0[0]:] 
-            freq_lst.append(p_freq)
-            phase_lst.append(phase)
-        df['%s'%key] = phase_lst
-        df['p_freq'] = freq_lst
+        # rows of different lengths cannot be stacked, they take the per row path
+        shared = len({len(f) for f in df['p_freq']}) == 1
+        if shared:
+            p_freq = np.vstack(df['p_freq'])
+            shared = bool((p_freq == p_freq[0]).all())
+        if shared:
+            phase, p_freq = self.unwrp_phase_batch(np.vstack(df['%s'%key]), p_freq[0])
+            df['%s'%key] = list(phase)
+            df['p_freq'] = [p_freq]*len(df)
+        else:
+            freq_lst = []
+            phase_lst = []
+            for i in range(len(df)):
+                phase, p_freq = self.unwrp_phase_batch(df.loc[i]['%s'%key], df.loc[i]['p_freq'])
+                freq_lst.append(p_freq)
+                phase_lst.append(phase[0])
+            df['%s'%key] = phase_lst
+            df['p_freq'] = freq_lst
         return df  
 
 
+    @profiler.timed('unwrp_phase')
+    def unwrp_phase_batch(self, phase, p_freq):
+
+        """Unwraps the phase of all rows at once and removes the low frequency offset.
+
+            A jump of more than pi between neighbouring bins is corrected by 2 pi, 
+            the offset is the intercept of a least squares line through 0.1 - 0.3 THz.
+        
+            *Arguments*
+    
+            phase : (n_phi, n_bins) array of wrapped phase, or a single 1D row.
+            p_freq : 1D frequency axis shared by all rows.
+
+            *Returns*
+
+            phase : (n_phi, n) array of unwrapped phase starting at 0.1 THz.
+            p_freq : 1D frequency axis of the returned phase.
+        """
+
+        phase = np.atleast_2d(np.asarray(phase, dtype = float))
+        p_freq = np.asarray(p_freq)
+        diff = np.diff(phase, axis = 1)
+        jumps = 2*np.pi*((diff < -np.pi).astype(int) - (diff > np.pi))
+        phase = phase.copy()
+        phase[:, 1:] += np.cumsum(jumps, axis = 1)
+
+        x0 = nearest_sorted(p_freq,0.1)
+        x1 = nearest_sorted(p_freq,0.3)
+        ex_freq = p_freq[x0:x1]
+        ex_phase = phase[:, x0:x1]
+        x_mean = ex_freq.mean()
+        y_mean = ex_phase.mean(axis = 1)
+        slope = ((ex_freq - x_mean)*(ex_phase - y_mean[:, None])).sum(axis = 1) \
+                / ((ex_freq - x_mean)**2).sum()
+        offset = y_mean - slope*x_mean
+        return phase[:, x0:] - offset[:, None], p_freq[x0:]
+
+
     def get_FD(self,time, TDS_signal): 
 
-        c_FFT = []
+        """Frequency domain data of a single trace as a one row dataframe.
+
+            Thin wrapper around get_FD_batch, kept for per trace callers.
+        """
+
+        res = self.get_FD_batch(time, TDS_signal)
+        return self.FD_to_DF(res, 1)
+
+
+    @profiler.timed('get_FD')
+    def get_FD_batch(self, time, TDS_signal):
+
+        """Frequency domain data for all traces of a scan in one vectorized pass.
+        
+            *Arguments*
+
+            time : 1D time axis shared by all traces, or (n_phi, n_samples) array
+                    of time axes. Only the first row is used for the sampling step.
+            TDS_signal : (n_phi, n_samples) array of TDS amplitudes, or a 1D trace.
+
+            *Returns*
+
+            dict with the shared axes 'freq' (limited to store_band) and 'p_freq'
+            (1D) and the dense (n_phi, n_bins) arrays 'FFT', 'c_FFT', 'phase' 
+            and 'slc_FFT', in complex64 / float32 if precision is 'single'.
+        """
+
+        e_time = np.asarray(time, dtype = float)
+        if e_time.ndim > 1:
+            e_time = e_time[0]
+        e_amp = np.atleast_2d(np.asarray(TDS_signal, dtype = float))
+        profiler.count('traces', len(e_amp))
+        plan = self.plan(e_amp.shape[1], e_time[1]-e_time[0])
         # Pad zeros on the time signal to reach this length
-        t_ser_len = 16384
-        phase = []
-        e_time = time
-        e_amp = TDS_signal
-        T = e_time[1]-e_time[0]                      
-        e_time = e_time - time[0]
-        N0 = len(e_time)
-        # e_time = e_time[:(self.find_nearest(e_time, self.win)[0])]                   
-        # e_amp = e_amp[:(self.find_nearest(e_time, self.win)[0])]
-        N = len(e_time)              
-        w = sgnl.tukey(N, alpha = 0.1) 
-
-        e_amp = w*(e_amp)                                     
-           
-        pad = t_ser_len - N  
-        e_time = np.append(e_time, np.zeros(pad))          
-        e_amp = np.append(e_amp, np.zeros(pad))
-        N0 = len(e_time)
-
-        freq = np.fft.fftfreq(N0, T)
-        zero_THz_idx = self.find_nearest(freq, 0)[0]
-        freq= freq[zero_THz_idx:int(len(freq)/2)]
-        e_FFT = np.fft.fft(e_amp)/(N0/2)   
-        e_FFT = e_FFT[zero_THz_idx:int(len(e_FFT)/2)]     
-        FFT = np.abs(e_FFT)
+        N0 = plan.t_ser_len
+
+        # real input, only the positive half is computed
+        e_FFT = np.fft.rfft(plan.window*e_amp, n = N0, axis = 1)[:, :plan.n_bins]/(N0/2)
+        if self.precision == 'single':
+            e_FFT = e_FFT.astype(np.complex64)
+        band = e_FFT[:, plan.start:plan.stop]
+        c_FFT = e_FFT[:, plan.keep]
+        if plan.keep != slice(0, plan.n_bins):
+            c_FFT = c_FFT.copy()        # free the bins outside the stored band
+        return {'freq': plan.freq,
+                'FFT': np.abs(c_FFT), 'c_FFT': c_FFT,
+                'p_freq': plan.p_freq,
+                'phase': np.angle(band), 'slc_FFT': np.abs(band)}
+
+
+    def get_FD_rows(self, times, amps):
+
+        """Spectra of traces that may differ in length or sampling step, one dataframe row per trace.
+
+            Traces sharing (n_samples, dt) are transformed together by get_FD_batch
+            and the results scattered back to their rows in the input order.
+
+            *Arguments*
+
+            times, amps : sequences of 1D time axes and TDS traces
+        """
+
+        import pandas as pd
+        groups = {}
+        for i, (t, a) in enumerate(zip(times, amps)):
+            t = np.asarray(t, dtype = float)
+            groups.setdefault((len(a), float(t[1] - t[0])), []).append(i)
+        cols = {}
+        for rows in groups.values():
+            res = self.get_FD_batch(times[rows[0]], np.vstack([amps[i] for i in rows]))
+            for key, val in res.items():
+                col = cols.setdefault(key, [None]*len(amps))
+                for j, i in enumerate(rows):
+                    col[i] = val if val.ndim == 1 else val[j]
+        return pd.DataFrame(cols)
+
+
+    def plan(self, N, dt):
+
+        """SpectralPlan for traces of N samples spaced dt with the current processing parameters"""
+
+        return spectral_plan(N, float(dt), self.pad_length(N, dt), self.tukey_alpha, tuple(self.band),
+                             None if self.store_band is None else tuple(self.store_band))
+
+
+    def pad_length(self, N, dt):
+
+        """Zero-padded length of traces of N samples spaced dt.
         
-        for j in range(len(e_FFT)):
-            phase.append(np.arctan2(e_FFT[j].imag,e_FFT[j].real))
-        phase = np.array(phase)
-        start = self.find_nearest(freq,0.2)[0]
-        stop = self.find_nearest(freq,2)[0]
-        slc_freq = freq[start:stop]
-        phase = phase[start:stop]
-        slc_FFT = FFT[start:stop]                        
-        p_freq = slc_freq
-        phase = phase
-        c_FFT.append({'freq':freq,
-                        'FFT': FFT, 'c_FFT': e_FFT,
-                        'p_freq' : p_freq ,
-                        'phase' : phase,'slc_FFT' : slc_FFT})
-        c_FFT = pd.DataFrame(c_FFT)
-        return c_FFT
+            t_ser_len, or with a target resolution (THz) the shortest power of
+            two that is at least N and reaches a bin spacing of resolution.
+            Traces longer than t_ser_len are padded to the next power of two
+            instead of being truncated.
+        """
+
+        if self.resolution is None:
+            return max(self.t_ser_len, int(2**np.ceil(np.log2(N))))
+        return int(2**np.ceil(np.log2(max(N, 1/(dt*self.resolution)))))
+
+
+    def FD_to_DF(self, res, n_rows):
+
+        """Expand the output of get_FD_batch to a dataframe with one row per trace"""
+
+        import pandas as pd
+        cols = {}
+        for key, val in res.items():
+            if val.ndim == 1:
+                cols[key] = [val]*n_rows
+            else:
+                cols[key] = list(val)
+        return pd.DataFrame(cols)
+
             
     def getDatetime2(self, filesrclist, dtlist):   
         """
@@ -137,18 +421,13 @@ class MenloLoader:
                 referenced in filesrclist.
         """  
         for j in range(len(filesrclist)):
-            with open(filesrclist[j]) as dtr: 
-                for com in dtr:
-                    if com.startswith('#') and "Timestamp" in com:
-                        dtlist.append(datetime.datetime.\
-                                        strptime(com.split('Timestamp')[1]\
-                                                .split('\n')[0][2:],
-                                                "%Y-%m-%dT%H:%M:%S"))                 
+            dtlist.append(read_menlo(filesrclist[j], data = False)['Datetime'])
         return dtlist
 
 
     def get_data(self, src_flist, src_TDS, dtlist):
 
+        import pandas as pd
         for i in range(len(src_flist)):
             name = src_flist[i].split("\\")[-1].split(".")[0]
             attrs = name.split("_")
@@ -163,6 +442,7 @@ class MenloLoader:
 
     def get_data2(self, src_flist, src_TDS, dtlist):
 
+        import pandas as pd
         for i in range(len(src_flist)):
             name = src_flist[i].split("\\")[-1].split(".")[0]
             chip = name.split("_")[0]
@@ -177,69 +457,99 @@ class MenloLoader:
 
     def FileLoader(self, src_flist):
 
+        """Parse every file once, files that fail are dropped from src_flist and 
+            their MenloFileError kept in self.errors"""
+
         src_TDS = []
         dtlist = []
-        #Look for TDS files and save paths to arrays
-        src_TDS = self.getTDS(src_flist, src_TDS)
-        dtlist = self.getDatetime(src_flist, dtlist)
+        for f in list(src_flist):
+            try:
+                res = read_menlo(f)
+            except MenloFileError as e:
+                self.errors.append(e)
+                src_flist.remove(f)
+                continue
+            src_TDS.append({'time': res['time'], 'amp': res['amp']})
+            dtlist.append(res['Datetime'])
         return src_TDS, dtlist    
 
             
     def File_Loader_Menlo(self, local_path, win = 400, norm_freq = 0):
 
-        src_flist = []
-        src_TDS = []
-        dtlist = []
-        path = local_path
+        src_flist = list(self.find_Menlo(local_path))
+    #         src_flist = self.data_selector(src_flist,meta,target)
+        src_TDS, dtlist = self.FileLoader(src_flist)
+        return src_flist, src_TDS, dtlist    
+
+
+    def find_Menlo(self, local_path):
 
-        #Look for TDS files and save paths to arrays
+        """Yield the paths of the TDS files below local_path as the directory is walked"""
 
-        for i, (dirpath, dirnames, filenames) in enumerate(os.walk(path)):
+        for i, (dirpath, dirnames, filenames) in enumerate(os.walk(local_path)):
             for a in filenames:
                 filename = os.path.join(dirpath, a)
                 if ('fft' not in filename and 'README' not in filename and '.yml' not in filename and '.txt' in filename):
-                    src_flist.append(filename)
-    #         src_flist = self.data_selector(src_flist,meta,target)
-        src_TDS = self.getTDS(src_flist, src_TDS)
-        dtlist = self.getDatetime2(src_flist, dtlist)
-        return src_flist, src_TDS, dtlist    
+                    yield filename
+
+
+    def iter_Menlo(self, local_path, spectra = False, workers = None, max_in_flight = None):
+
+        """Parse the TDS files below local_path on a process pool, streaming the results.
+        
+            At most max_in_flight files are submitted at a time, so memory stays 
+            flat however large the directory is. Files that fail to parse are 
+            skipped and their MenloFileError kept in self.errors.
+
+            *Arguments*
+
+            local_path : directory to walk
+            spectra : also compute the get_FD_batch spectra of every trace
+            workers : number of worker processes, all cores by default
+            max_in_flight : bound on submitted but not yet consumed files, 
+                            4 per worker by default
+
+            *Yields*
+
+            (path, res) in order of completion, res is the read_menlo dict, 
+            updated with the get_FD_batch results if spectra is set
+        """
+
+        params = self.processing_params() if spectra else None
+        workers = workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or 4*workers
+        with ProcessPoolExecutor(workers) as pool:
+            paths = self.find_Menlo(local_path)
+            pending = {}
+            while True:
+                for f in paths:
+                    pending[pool.submit(_read_menlo_worker, f, params)] = f
+                    if len(pending) >= max_in_flight:
+                        break
+                if not pending:
+                    profiler.snapshot('menlo_streamed')
+                    return
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+                for fut in done:
+                    f = pending.pop(fut)
+                    try:
+                        res = fut.result()
+                    except MenloFileError as e:
+                        self.errors.append(e)
+                        continue
+                    yield f, res
 
 
     def getTDS(self,src_flist, des_TDS):   
 
         for j in range(len(src_flist)):
-            e_time = []
-            e_amp = []
-            with open(src_flist[j]) as csvfile: 
-                reader = csv.reader(csvfile, delimiter ='\t')
-                for k in range(5): next(reader)
-                for row in reader:
-                    e_time.append(float(row[0]))
-                    e_amp.append(float(row[1]))           
-                e_time = np.array(e_time) - e_time[0]        
-                des_TDS.append({'time':np.array(e_time), 'amp':np.array(e_amp)})
+            res = read_menlo(src_flist[j])
+            des_TDS.append({'time': res['time'], 'amp': res['amp']})
         return des_TDS
     
 
     def getDatetime(self, filesrclist, dtlist):    
 
         for j in range(len(filesrclist)):
-            with open(filesrclist[j]) as dtr: 
-                for com in dtr:
-                    if com.startswith('#') and "Timestamp" in com and 'wafer' not in com:
-                        dtlist.append(
-                                      datetime.datetime.strptime(com.split('Timestamp')[1]\
-                                                                 .split('\n')[0][2:],
-                                                                '%y-%m-%dT%H:%M:%S'))                   
-                    elif com.startswith('#') and "Timestamp" in com and 'wafer' in com:
-                        try:
-                            dtlist.append(
-                                          datetime.datetime.strptime(com.split('Timestamp')[1].split(',')[0] \
-                                                                 .split('\n')[0][2:][2:],
-                                                                '%y-%m-%dT%H:%M:%S'))                   
-                        except ValueError:                                                            
-                            print("Incorrect file type")
-
+            dtlist.append(read_menlo(filesrclist[j], data = False)['Datetime'])
         return dtlist
-
-    
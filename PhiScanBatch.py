@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+from PhiScanDataModel import Analyser, MenloLoader
+from PhiScanCache import ScanCache
+
+
+_analyser = None        # per worker Analyser holding the reference scan
+
+
+def datasetKey(f):
+
+    """Dataset name of a file, as shown in the viewer table"""
+
+    return os.path.splitext(os.path.basename(f))[0].split("_")[0]
+
+
+def initWorker(reference, phiRange, cacheDir, params):
+
+    """Load the reference once per worker process, with the MenloLoader processing parameters params"""
+
+    global _analyser
+    _analyser = Analyser(ScanCache(cacheDir) if cacheDir else None, precision = params['precision'])
+    _analyser.ml.set_processing_params(params)
+    ref = _analyser.loadScan(reference)
+    ref.phi = np.linspace(*phiRange, len(ref))
+    _analyser.add_scan(datasetKey(reference), ref)
+    _analyser.set_reference(datasetKey(reference))
+
+
+def processScan(f, outDir, phiRange, band):
+
+    """Compute the spectra and results against the reference of one pickle and save them"""
+
+    t0 = time.perf_counter()
+    key = datasetKey(f)
+    summary = {'dataset': key, 'file': f}
+    try:
+        scan = _analyser.loadScan(f)
+        scan.phi = np.linspace(*phiRange, len(scan))
+        for k, v in _analyser.sample_results(scan, _analyser.referenceDF).items():
+            setattr(scan, k, v)
+        # lets the viewer keep these results while its reference has the same source
+        scan.meta['reference'] = np.full(len(scan), _analyser.referenceKey)
+        scan.meta['reference_source'] = np.full(len(scan), _analyser.referenceDF.source)
+        out = os.path.join(outDir, key + '.npz')
+        scan.save(out)
+        inBand = (scan.freq >= band[0]) & (scan.freq <= band[1])
+        tr = scan.TR[:, inBand]
+        summary.update({'output': out, 'n_phi': len(scan), 'n_bins': scan.FFT.shape[1],
+                        'TR_mean': float(tr.mean()), 'TR_min': float(tr.min()),
+                        'TR_max': float(tr.max()), 'status': 'ok'})
+    except Exception as e:
+        summary.update({'status': 'failed', 'error': repr(e)})
+    summary['seconds'] = round(time.perf_counter() - t0, 3)
+    return summary
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Process PhiScan pickles against a reference without the viewer")
+    parser.add_argument('files', nargs = '+', help = "PhiScan .pkl files of the samples")
+    parser.add_argument('-r', '--reference', required = True, help = "PhiScan .pkl file of the reference")
+    parser.add_argument('-o', '--out', default = 'results', help = "output directory")
+    parser.add_argument('-j', '--workers', type = int, default = None, help = "worker processes, all cores by default")
+    parser.add_argument('--phi', type = float, nargs = 2, default = (90, -90), metavar = ('START', 'STOP'),
+                        help = "angle of the first and last trace in deg")
+    parser.add_argument('--band', type = float, nargs = 2, default = (0.2, 2), metavar = ('F0', 'F1'),
+                        help = "band in THz of the TR summary statistics")
+    parser.add_argument('--cache', default = None, help = "ScanCache directory to reuse processed spectra")
+    parser.add_argument('--precision', choices = ('double', 'single'), default = 'double',
+                        help = "precision of the stored spectra and results")
+    parser.add_argument('--resolution', type = float, default = None, metavar = 'THZ',
+                        help = "target frequency resolution, picks the zero-padded length instead of 16384")
+    parser.add_argument('--store-band', type = float, nargs = 2, default = None, metavar = ('F0', 'F1'),
+                        help = "THz band of the stored spectra, all bins by default")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok = True)
+    params = dict(MenloLoader([]).processing_params(), precision = args.precision,
+                  resolution = args.resolution, store_band = args.store_band)
+    files = [f for f in dict.fromkeys(args.files + [args.reference])]
+    summaries = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer = initWorker,
+                             initargs = (args.reference, args.phi, args.cache, params)) as pool:
+        jobs = [pool.submit(processScan, f, args.out, args.phi, args.band) for f in files]
+        for job in as_completed(jobs):
+            summary = job.result()
+            summaries.append(summary)
+            print(f"{summary['dataset']:>12}  {summary['status']:>6}  {summary['seconds']:7.2f} s")
+    summaries.sort(key = lambda s: files.index(s['file']))
+    with open(os.path.join(args.out, 'summary.json'), 'w') as f:
+        json.dump({'reference': args.reference, 'phi': list(args.phi), 'band': list(args.band),
+                   'seconds': round(time.perf_counter() - t0, 3), 'datasets': summaries}, f, indent = 2)
+    pd.DataFrame(summaries).to_csv(os.path.join(args.out, 'summary.csv'), index = False)
+    print(f"Processed {len(files)} datasets in {time.perf_counter() - t0:.2f} s -> {args.out}")
+    return 0 if all(s['status'] == 'ok' for s in summaries) else 1
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,372 @@
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from scipy import signal as sgnl
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+from PhiScanDataModel import Analyser, MenloLoader, read_menlo, track_resonance
+
+
+# ----------------------------------------------------------------------------
+# Synthetic phi scans
+
+def synthScan(n_phi = 360, n_samples = 2000, dt = 0.05, seed = 0, resonance = 0.9):
+
+    """Synthetic THz-TDS phi scan.
+
+        Each trace is a single cycle pulse plus a ringing resonance whose
+        strength follows cos^2(phi), with a small jitter of the pulse position
+        and white noise.
+
+        *Returns*
+
+        phi (n_phi,), time (n_samples,) in ps and amp (n_phi, n_samples)
+    """
+
+    rng = np.random.default_rng(seed)
+    phi = np.linspace(90, -90, n_phi)
+    time = 3 + np.arange(n_samples)*dt
+    t0 = time[0] + 0.25*n_samples*dt + 0.02*rng.standard_normal((n_phi, 1))
+    tau = time[None, :] - t0
+    pulse = -tau/0.25*np.exp(-(tau/0.25)**2)
+    ring = np.cos(np.deg2rad(phi))[:, None]**2*np.sin(2*np.pi*resonance*tau)*np.exp(-tau/8)*(tau > 0)
+    amp = pulse + 0.2*ring + 1e-3*rng.standard_normal((n_phi, n_samples))
+    return phi, time, amp
+
+
+def synthDF(n_phi = 360, n_samples = 2000, seed = 0):
+
+    """Synthetic scan in the layout of the PhiScan pickles the viewer reads"""
+
+    phi, time, amp = synthScan(n_phi, n_samples, seed = seed)
+    return pd.DataFrame({'time': [time.copy() for i in range(n_phi)], 'amp': list(amp),
+                         'freq': [np.zeros(1)]*n_phi, 'FFT': [np.zeros(1)]*n_phi, 'phi': phi})
+
+
+def writeMenloTrace(path, i, time, amp):
+
+    """Write trace number i as a Menlo TDS text file, alternating both timestamp variants"""
+
+    stamp = f"2021-03-05T12:{i % 60:02d}:00, wafer W1" if i % 2 else f"21-03-05T12:{i % 60:02d}:00"
+    with open(path, 'w') as f:
+        f.write(f"# TeraSmart\n# Timestamp: {stamp}\n# Averages: 1000\n# Range: 100 ps\n# pos (ps)\tsignal (nA)\n")
+        np.savetxt(f, np.column_stack([time + 1000, amp]), fmt = '%.6f', delimiter = '\t')
+
+
+def writeMenlo(dirname, n_files, n_samples = 2000, seed = 0):
+
+    """Write n_files Menlo TDS text files of a synthetic scan"""
+
+    phi, time, amp = synthScan(n_files, n_samples, seed = seed)
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(dirname, f"C1-3_{i:04d}.txt")
+        writeMenloTrace(path, i, time, amp[i])
+        paths.append(path)
+    return paths
+
+
+# ----------------------------------------------------------------------------
+# Per-trace implementations the batched code replaced, used as numerical reference
+
+def legacy_get_FD(ml, time, TDS_signal):
+
+    t_ser_len = 16384
+    e_time = time - time[0]
+    T = time[1] - time[0]
+    N = len(e_time)
+    e_amp = sgnl.windows.tukey(N, alpha = 0.1)*TDS_signal
+    e_amp = np.append(e_amp, np.zeros(t_ser_len - N))
+    N0 = t_ser_len
+    freq = np.fft.fftfreq(N0, T)
+    zero_THz_idx = ml.find_nearest(freq, 0)[0]
+    freq = freq[zero_THz_idx:int(len(freq)/2)]
+    e_FFT = np.fft.fft(e_amp)/(N0/2)
+    e_FFT = e_FFT[zero_THz_idx:int(len(e_FFT)/2)]
+    FFT = np.abs(e_FFT)
+    phase = np.array([np.arctan2(c.imag, c.real) for c in e_FFT])
+    start = ml.find_nearest(freq, 0.2)[0]
+    stop = ml.find_nearest(freq, 2)[0]
+    return {'freq': freq, 'FFT': FFT, 'c_FFT': e_FFT, 'p_freq': freq[start:stop],
+            'phase': phase[start:stop], 'slc_FFT': FFT[start:stop]}
+
+
+def legacy_unwrp_phase(ml, phase, p_freq):
+
+    phase = np.array(phase)
+    for m in range(1, len(phase)):
+        diff = phase[m] - phase[m-1]
+        if diff > np.pi:
+            phase[m:] = phase[m:] - 2*np.pi
+        elif diff < -np.pi:
+            phase[m:] = phase[m:] + 2*np.pi
+    x0 = ml.find_nearest(p_freq, 0.1)[0]
+    x1 = ml.find_nearest(p_freq, 0.3)[0]
+    # least squares line, as the sklearn LinearRegression used before
+    offset = np.polyfit(p_freq[x0:x1], phase[x0:x1], 1)[1]
+    return phase[x0:] - offset, p_freq[x0:]
+
+
+def legacy_convDF(ml, df):
+
+    df = df.drop(['freq', 'FFT'], axis = 1).reset_index(drop = True)
+    res = pd.DataFrame([legacy_get_FD(ml, df.loc[i]['time'], df.loc[i]['amp']) for i in range(len(df))])
+    return pd.concat([res, df], axis = 1)
+
+
+def legacy_correctPhase(ml, p_d, p_freq):
+
+    return p_d - p_d[ml.find_nearest(p_freq, 0.2)[0]]
+
+
+def legacy_get_samples(ml, df_m, df_r):
+
+    res = {'pd': [], 'TR': [], 'c_tr': []}
+    for j in range(len(df_m)):
+        p_d, p_freq = legacy_unwrp_phase(ml, df_m.loc[j]['phase'] - df_r.loc[j]['phase'], df_m.loc[j]['p_freq'])
+        res['pd'].append(legacy_correctPhase(ml, p_d, p_freq))
+        res['TR'].append(df_m.loc[j]['FFT']/df_r.loc[j]['FFT'])
+        res['c_tr'].append(df_m.loc[j]['c_FFT']/df_r.loc[j]['c_FFT'])
+    return {k: np.vstack(v) for k, v in res.items()}
+
+
+def legacy_resonance(x, y):
+
+    # highest bin and a least squares parabola through it and its neighbours,
+    # its vertex kept within half a bin as for a peak on the band edge
+    i = min(max(int(np.argmax(y)), 1), len(y) - 2)
+    fit = np.polyfit(x[i-1:i+2], y[i-1:i+2], 2)
+    dx = (x[i+1] - x[i-1])/4
+    f = np.clip(-fit[1]/(2*fit[0]), x[i] - dx, x[i] + dx)
+    return f, np.polyval(fit, f)
+
+
+def legacy_getTDS(path):
+
+    e_time, e_amp = [], []
+    with open(path) as csvfile:
+        reader = csv.reader(csvfile, delimiter = '\t')
+        for k in range(5): next(reader)
+        for row in reader:
+            e_time.append(float(row[0]))
+            e_amp.append(float(row[1]))
+    return np.array(e_time) - e_time[0], np.array(e_amp)
+
+
+# ----------------------------------------------------------------------------
+# Timing
+
+def measure(fn, repeat = 3):
+
+    """Best wall time of fn over repeat runs and the peak traced memory of one run"""
+
+    best = np.inf
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return res, best, peak
+
+
+def maxdiff(a, b):
+
+    return float(np.max(np.abs(np.asarray(a) - np.asarray(b))))
+
+
+def reldiff(a, b):
+
+    """maxdiff relative to the magnitude of a where it exceeds 1, e.g. for TR near spectral zeros"""
+
+    a, b = np.asarray(a), np.asarray(b)
+    return float(np.max(np.abs(a - b)/np.maximum(np.abs(a), 1)))
+
+
+def frameCost(analyser, keys, frames):
+
+    """Mean time of one animation tick (row slice plus setData for every dataset), None without Qt"""
+
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        import pyqtgraph as pg
+    except ImportError:
+        return None
+    app = QApplication.instance() or QApplication([])
+    plot = pg.PlotWidget()
+    curves = [plot.plot() for key in keys]
+    ydB = {key: 20*np.log(np.abs(analyser.dfDict[key].FFT)) for key in keys}
+    t0 = time.perf_counter()
+    for i in range(frames):
+        for key, curve in zip(keys, curves):
+            curve.setData(analyser.dfDict[key].freq, ydB[key][i % len(ydB[key])])
+        app.processEvents()
+    return (time.perf_counter() - t0)/frames
+
+
+def precisionCheck(n_phi, n_samples):
+
+    """Largest deviation of single precision spectra and results from double precision.
+
+        *Returns*
+
+        dict with the errors of the FFT in dB, the relative error of TR, the
+        error of pd in rad and the scan sizes in MiB of both precisions
+    """
+
+    scans = {}
+    for precision in ('double', 'single'):
+        analyser = Analyser(precision = precision)
+        ref = analyser.convScan(synthDF(n_phi, n_samples, seed = 0))
+        scans[precision] = analyser.get_samples(analyser.convScan(synthDF(n_phi, n_samples, seed = 1)), ref)
+    d, s = scans['double'], scans['single']
+    dB = lambda x: 20*np.log10(np.abs(x))
+    return {'FFT_dB': maxdiff(dB(d.FFT), dB(s.FFT)),
+            'TR_rel': float(np.max(np.abs((s.TR - d.TR)/d.TR))),
+            'pd_rad': maxdiff(d.pd, s.pd),
+            'double_MiB': d.nbytes/2**20, 'single_MiB': s.nbytes/2**20}
+
+
+def run(n_phi, n_samples, n_datasets, repeat, n_files, legacy):
+
+    results = []
+    ml = MenloLoader([])
+    tol = 1e-9
+
+    def report(stage, seconds, peak, items, unit, check = None, tol = tol):
+        row = {'stage': stage, 'seconds': seconds, 'throughput': items/seconds,
+               'unit': unit, 'peak_MiB': None if peak is None else peak/2**20}
+        if check is not None:
+            row['maxdiff'] = check
+            row['equivalent'] = bool(check < tol)
+        results.append(row)
+        eq = '' if check is None else f"  maxdiff {check:.2e} {'OK' if check < tol else 'MISMATCH'}"
+        mem = '        -    ' if peak is None else f"{peak/2**20:9.1f} MiB"
+        print(f"{stage:<24}{seconds*1e3:10.2f} ms {items/seconds:12.1f} {unit:<10}{mem}{eq}")
+
+    phi, t, amp = synthScan(n_phi, n_samples)
+    print(f"{n_phi} angles x {n_samples} samples, {n_datasets} datasets\n")
+    print(f"{'stage':<24}{'time':>13} {'throughput':>12} {'':<10}{'peak':>13}")
+
+    fd, sec, peak = measure(lambda: ml.get_FD_batch(t, amp), repeat)
+    check = None
+    if legacy:
+        ref = [legacy_get_FD(ml, t, a) for a in amp[:8]]
+        check = max(maxdiff(np.vstack([r[k] for r in ref]), fd[k][:8])
+                    for k in ('FFT', 'c_FFT', 'phase', 'slc_FFT'))
+        lsec = measure(lambda: [legacy_get_FD(ml, t, a) for a in amp[:16]], 1)[1]*n_phi/16
+        report('get_FD (per trace)', lsec, None, n_phi, 'traces/s')
+    report('get_FD_batch', sec, peak, n_phi, 'traces/s', check)
+    limited = MenloLoader([])
+    limited.resolution, limited.store_band = 0.005, (0.1, 3)
+    fd_l, sec, peak = measure(lambda: limited.get_FD_batch(t, amp), repeat)
+    report('get_FD_batch (band)', sec, peak, n_phi, 'traces/s')
+    print(f"{'':<24}{fd_l['c_FFT'].shape[1]} of {fd['c_FFT'].shape[1]} bins stored at 0.005 THz, 0.1 - 3 THz")
+
+    pdiff = fd['phase'] - ml.get_FD_batch(t, synthScan(n_phi, n_samples, seed = 1)[2])['phase']
+    (uw, uw_freq), sec, peak = measure(lambda: ml.unwrp_phase_batch(pdiff, fd['p_freq']), repeat)
+    check = None
+    if legacy:
+        check = max(maxdiff(legacy_unwrp_phase(ml, row, fd['p_freq'])[0], uw[i])
+                    for i, row in enumerate(pdiff[:8]))
+        lsec = measure(lambda: [legacy_unwrp_phase(ml, row, fd['p_freq']) for row in pdiff[:16]], 1)[1]*n_phi/16
+        report('unwrp_phase (per row)', lsec, None, n_phi, 'rows/s')
+    report('unwrp_phase_batch', sec, peak, n_phi, 'rows/s', check)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = writeMenlo(tmp, n_files, n_samples)
+        res, sec, peak = measure(lambda: [read_menlo(p) for p in paths], repeat)
+        check = None
+        if legacy:
+            check = max(maxdiff(legacy_getTDS(p)[1], r['amp']) for p, r in zip(paths, res))
+            lsec = measure(lambda: [legacy_getTDS(p) for p in paths], 1)[1]
+            report('getTDS (csv)', lsec, None, n_files, 'files/s')
+        report('read_menlo', sec, peak, n_files, 'files/s', check)
+    finally:
+        shutil.rmtree(tmp)
+
+    analyser = Analyser()
+    dfs = [synthDF(n_phi, n_samples, seed = i) for i in range(n_datasets)]
+    spectra = ('FFT', 'c_FFT', 'phase', 'slc_FFT')
+    if legacy:
+        # first rows of the reference and the last sample, transformed trace by trace
+        ldfr, ldfm = [legacy_convDF(ml, dfs[i].iloc[:8]) for i in (0, -1)]
+        lsamples = legacy_get_samples(ml, ldfm, ldfr)
+    scans, sec, peak = measure(lambda: [analyser.convScan(df) for df in dfs], repeat)
+    check = None
+    if legacy:
+        check = max(maxdiff(np.vstack(ldfr[k]), getattr(scans[0], k)[:8]) for k in spectra)
+    report('convScan', sec, peak, n_datasets*n_phi, 'traces/s', check)
+    df, sec, peak = measure(lambda: analyser.convDF(dfs[0].copy()), repeat)
+    check = None
+    if legacy:
+        check = max(maxdiff(np.vstack(ldfr[k]), np.vstack(df[k][:8])) for k in spectra)
+    report('convDF', sec, peak, n_phi, 'traces/s', check)
+
+    keys = [f"D{i}" for i in range(n_datasets)]
+    for key, scan in zip(keys, scans):
+        analyser.add_scan(key, scan)
+    res, sec, peak = measure(lambda: [analyser.sample_results(s, scans[0]) for s in scans], repeat)
+    check = None
+    if legacy:
+        check = max(reldiff(lsamples[k], res[-1][k][:8]) for k in ('pd', 'TR', 'c_tr'))
+    report('get_samples (scans)', sec, peak, n_datasets*n_phi, 'rows/s', check)
+    df, sec, peak = measure(lambda: analyser.get_samples(analyser.convDF(dfs[-1].copy()),
+                                                         analyser.convDF(dfs[0].copy())), 1)
+    check = None
+    if legacy:
+        check = max(reldiff(lsamples[k], np.vstack(df[k][:8])) for k in ('pd', 'TR', 'c_tr'))
+    report('get_samples (DataFrame)', sec, peak, n_phi, 'rows/s', check)
+
+    # the synthetic ringing shows up as a peak of the spectrum near 0.9 THz
+    cols = (fd['freq'] >= 0.8) & (fd['freq'] <= 1.0)
+    tracks, sec, peak = measure(lambda: track_resonance(fd['freq'][cols], fd['FFT'][:, cols], 'max'), repeat)
+    check = None
+    if legacy:
+        ref = np.array([legacy_resonance(fd['freq'][cols], row[cols]) for row in fd['FFT'][:8]])
+        check = max(maxdiff(ref[:, 0], tracks['freq'][:8]), maxdiff(ref[:, 1], tracks['value'][:8]))
+    report('track_resonance', sec, peak, n_phi, 'rows/s', check)
+
+    cost = frameCost(analyser, keys, min(n_phi, 200))
+    if cost is not None:
+        report('refreshPlot frame', cost, None, 1, 'frames/s')
+
+    err, sec, peak = measure(lambda: precisionCheck(n_phi, n_samples), 1)
+    print(f"\nsingle precision: {err['single_MiB']:.1f} MiB per scan instead of {err['double_MiB']:.1f} MiB")
+    for stage, key, limit in (('single FFT (dB)', 'FFT_dB', 1e-3), ('single TR (relative)', 'TR_rel', 1e-5),
+                              ('single pd (rad)', 'pd_rad', 1e-5)):
+        report(stage, sec, peak, n_phi, 'rows/s', err[key], limit)
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark the phi scan processing hot paths on synthetic data")
+    parser.add_argument('--angles', type = int, default = 360)
+    parser.add_argument('--samples', type = int, default = 2000, help = "samples per TDS trace")
+    parser.add_argument('--datasets', type = int, default = 4)
+    parser.add_argument('--files', type = int, default = 200, help = "Menlo text files for the parser stage")
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--no-legacy', action = 'store_true', help = "skip the per-trace reference implementations")
+    parser.add_argument('--json', default = None, help = "write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.angles, args.samples, args.datasets, args.repeat, args.files, not args.no_legacy)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent = 2)
+    sys.exit(0 if all(r.get('equivalent', True) for r in results) else 1)
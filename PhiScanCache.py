@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import json
+import shutil
+import pickle
+import hashlib
+import argparse
+import numpy as np
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+from PhiScanDataModel import PhiScan
+
+
+class ScanCache():
+
+    """On-disk cache of processed PhiScans.
+
+        Every entry is a directory of .npy files, one per PhiScan array, which
+        are opened memory-mapped. Entries are keyed by a hash of the source file
+        and the MenloLoader processing parameters. The least recently used
+        entries are evicted once the cache grows beyond maxBytes.
+    """
+
+    version = 1         # bump when the stored layout changes
+    arrays = ('phi', 'time', 'amp') + PhiScan.spectra
+
+
+    def __init__(self, cacheDir = None, maxBytes = 4*2**30):
+
+        if cacheDir is None:
+            cacheDir = os.environ.get('PHISCAN_CACHE',
+                                      os.path.join(os.path.expanduser('~'), '.cache', 'PhiScanDataViewer'))
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        os.makedirs(self.cacheDir, exist_ok = True)
+
+
+    @classmethod
+    def key(cls, path, params):
+
+        """Cache key of a source file processed with the given parameters.
+
+            Also kept as PhiScan.source, it identifies the spectra of a scan
+            without a cache, e.g. the reference of PhiScanBatch results.
+        """
+
+        h = hashlib.blake2b(digest_size = 20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                h.update(chunk)
+        h.update(json.dumps({'version': cls.version, **params}, sort_keys = True).encode())
+        return h.hexdigest()
+
+
+    def load(self, key):
+
+        """Memory-mapped PhiScan stored under key, or None"""
+
+        entry = os.path.join(self.cacheDir, key)
+        if not os.path.isdir(entry):
+            return None
+        try:
+            arrs = {a: np.load(os.path.join(entry, a + '.npy'), mmap_mode = 'r') for a in self.arrays}
+            with open(os.path.join(entry, 'meta.pkl'), 'rb') as f:
+                meta = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            shutil.rmtree(entry, ignore_errors = True)
+            return None
+        os.utime(entry)
+        scan = PhiScan(arrs['phi'], arrs['time'], arrs['amp'], meta)
+        for a in PhiScan.spectra:
+            setattr(scan, a, arrs[a])
+        return scan
+
+
+    def store(self, key, scan):
+
+        """Write the raw arrays and spectra of scan under key and evict old entries"""
+
+        entry = os.path.join(self.cacheDir, key)
+        if os.path.isdir(entry):
+            return
+        tmp = entry + f".{os.getpid()}.tmp"
+        os.makedirs(tmp, exist_ok = True)
+        for a in self.arrays:
+            np.save(os.path.join(tmp, a + '.npy'), np.ascontiguousarray(getattr(scan, a)))
+        with open(os.path.join(tmp, 'meta.pkl'), 'wb') as f:
+            pickle.dump(scan.meta, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # stored concurrently under the same key
+            shutil.rmtree(tmp, ignore_errors = True)
+        self.evict()
+
+
+    def entries(self):
+
+        """List of (last use, size in bytes, key), least recently used first"""
+
+        res = []
+        for key in os.listdir(self.cacheDir):
+            entry = os.path.join(self.cacheDir, key)
+            if not os.path.isdir(entry) or key.endswith('.tmp'):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            res.append((os.path.getmtime(entry), size, key))
+        return sorted(res)
+
+
+    def evict(self):
+
+        """Remove least recently used entries until the cache fits in maxBytes"""
+
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for last, size, key in entries:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(os.path.join(self.cacheDir, key), ignore_errors = True)
+            total -= size
+
+
+    def invalidate(self, key = None):
+
+        """Remove the entry key, or every entry if key is None"""
+
+        keys = [key] if key is not None else [e[2] for e in self.entries()]
+        for k in keys:
+            shutil.rmtree(os.path.join(self.cacheDir, k), ignore_errors = True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Inspect or clear the processed PhiScan cache")
+    parser.add_argument('--dir', default = None, help = "cache directory")
+    parser.add_argument('--clear', action = 'store_true', help = "remove every cached scan")
+    parser.add_argument('--invalidate', metavar = 'FILE', nargs = '+', default = [],
+                        help = "remove the cached scans of these source files")
+    args = parser.parse_args()
+
+    from PhiScanDataModel import MenloLoader
+    cache = ScanCache(args.dir)
+    if args.clear:
+        cache.invalidate()
+    for f in args.invalidate:
+        cache.invalidate(cache.key(f, MenloLoader([]).processing_params()))
+    entries = cache.entries()
+    print(f"{cache.cacheDir}: {len(entries)} scans, {sum(e[1] for e in entries)/2**20:.1f} MiB")
+    for last, size, key in entries[::-1]:
+        print(f"{key}  {size/2**20:8.1f} MiB  {time.strftime('%Y-%m-%d %H:%M', time.localtime(last))}")
@@ -1,43 +1,763 @@
 from MenloLoader import *
+from collections import OrderedDict
+
+
+class PhiScan():
+
+    """Dense phi scan dataset with one row per polarisation angle.
+
+        Per angle quantities are stored as contiguous (n_phi, n_bins) arrays,
+        frequency axes are stored once per scan. Spectra are filled in by
+        Analyser.convScan, 'pd', 'TR' and 'c_tr' by Analyser.get_samples.
+        source is the ScanCache.key of the file and processing parameters
+        the spectra were computed from, if known.
+    """
+
+    __slots__ = ('phi', 'time', 'amp', 'freq', 'FFT', 'c_FFT', 'p_freq', 'phase',
+                 'slc_FFT', 'pd_freq', 'pd', 'TR', 'c_tr', 'meta', 'source')
+
+    spectra = ('freq', 'FFT', 'c_FFT', 'p_freq', 'phase', 'slc_FFT')
+    samples = ('pd_freq', 'pd', 'TR', 'c_tr')
+
+
+    def __init__(self, phi, time, amp, meta = None):
+
+        self.phi = np.asarray(phi)
+        self.time = np.asarray(time)
+        self.amp = np.asarray(amp)
+        self.meta = {} if meta is None else meta
+        self.source = None
+        for key in self.spectra + self.samples:
+            setattr(self, key, None)
+
+
+    def __len__(self):
+
+        return len(self.phi)
+
+
+    @classmethod
+    def from_DF(cls, df):
+
+        """Build a scan from a dataframe with 'time', 'amp' and optionally 'phi' columns.
+
+            Scalar columns such as 'design', 'sensor_id' or 'Datetime' are kept
+            in meta, array valued columns other than time and amp are dropped.
+        """
+
+        phi = np.asarray(df['phi'], dtype = float) if 'phi' in df else np.arange(len(df))
+        meta = {}
+        for col in df.columns:
+            if col in ('time', 'amp', 'phi') or len(df) == 0:
+                continue
+            if not isinstance(df[col].iloc[0], np.ndarray):
+                meta[col] = df[col].to_numpy()
+        return cls(phi, np.vstack(df['time']), np.vstack(df['amp']), meta)
+
+
+    @property
+    def nbytes(self):
+
+        return sum(getattr(self, key).nbytes for key in PhiScan.__slots__
+                   if isinstance(getattr(self, key), np.ndarray))
+
+
+    def save(self, path):
+
+        """Write every array of the scan and its meta data to an .npz file"""
+
+        arrs = {key: getattr(self, key) for key in PhiScan.__slots__
+                if isinstance(getattr(self, key), np.ndarray)}
+        for key, val in self.meta.items():
+            arrs['meta_' + key] = np.asarray(val)
+        if self.source is not None:
+            arrs['source'] = np.asarray(self.source)
+        np.savez(path, **arrs)
+
+
+    @classmethod
+    def load(cls, path):
+
+        """Read a scan written by save"""
+
+        with np.load(path, allow_pickle = True) as f:
+            meta = {key[5:]: f[key] for key in f.files if key.startswith('meta_')}
+            scan = cls(f['phi'], f['time'], f['amp'], meta)
+            for key in scan.spectra + scan.samples:
+                if key in f.files:
+                    setattr(scan, key, f[key])
+            if 'source' in f.files:
+                scan.source = str(f['source'])
+        return scan
+
+
+    def to_DF(self):
+
+        """Export to the dataframe layout produced by convDF and get_samples"""
+
+        import pandas as pd
+        n = len(self)
+        cols = {}
+        for key in self.spectra + ('time', 'amp'):
+            arr = getattr(self, key)
+            if arr is not None:
+                cols[key] = [arr]*n if arr.ndim == 1 else list(arr)
+        for key, val in self.meta.items():
+            cols[key] = list(val)
+        cols['phi'] = self.phi
+        if self.pd is not None:
+            cols['pd'] = list(self.pd)
+            cols['TR'] = list(self.TR)
+            cols['c_tr'] = list(self.c_tr)
+            cols['p_freq'] = [self.pd_freq]*n
+        return pd.DataFrame(cols)
+
+
+class LiveScan(PhiScan):
+
+    """PhiScan of an acquisition in progress, growing one angle at a time.
+
+        Rows are written into ring buffers preallocated for capacity angles,
+        the PhiScan attributes are views of the filled rows. Once capacity
+        angles were acquired the next frame overwrites row 0, so with capacity
+        set to the angles of one rotation row i always holds angle i of the
+        latest rotation.
+    """
+
+    __slots__ = ('capacity', 'count', 'buffers', 'reference')
+
+
+    def __init__(self, capacity = 360, meta = None):
+
+        super().__init__(np.zeros(0), np.zeros((0, 0)), np.zeros((0, 0)), meta)
+        self.capacity = capacity
+        self.count = 0              # frames appended, including overwritten ones
+        self.buffers = {}           # PhiScan attribute -> (capacity, ...) array
+        self.reference = None       # dataset key the sample rows are computed against
+
+
+    def append(self, phi, arrays):
+
+        """Store a new angle, arrays holds one-row blocks of it and shared 1-D axes.
+
+            *Returns*
+
+            slice of the row it was written to
+        """
+
+        rows = slice(self.count % self.capacity, self.count % self.capacity + 1)
+        self.count += 1
+        self.write(rows, dict(arrays, phi = np.array([phi], dtype = float)))
+        return rows
+
+
+    def write(self, rows, arrays):
+
+        """Write the blocks of arrays to rows, 1-D arrays other than phi are shared axes"""
+
+        for key, val in arrays.items():
+            val = np.asarray(val)
+            if val.ndim == 1 and key != 'phi':
+                setattr(self, key, val)
+                continue
+            if key not in self.buffers:
+                # rows never written stay NaN, e.g. samples without a reference row
+                self.buffers[key] = np.full((self.capacity,) + val.shape[1:], np.nan, dtype = val.dtype)
+            self.buffers[key][rows] = val
+        n = min(self.count, self.capacity)
+        for key, buf in self.buffers.items():
+            setattr(self, key, buf[:n])
+
+
+    def drop(self, keys):
+
+        """Forget the buffers of keys, e.g. the sample rows after the reference changed"""
+
+        for key in keys:
+            self.buffers.pop(key, None)
+            setattr(self, key, None)
+
+
+class FrameCache():
+
+    """Least recently used store of computed frames, bounded by a budget in bytes"""
+
+    def __init__(self, budget):
+
+        self.budget = budget
+        self.nbytes = 0
+        self.rows = OrderedDict()       # key -> (frame, size in bytes)
+
+
+    def get(self, key):
+
+        entry = self.rows.get(key)
+        if entry is None:
+            return None
+        self.rows.move_to_end(key)
+        return entry[0]
+
+
+    def put(self, key, frame, nbytes):
+
+        if key in self.rows:
+            self.nbytes -= self.rows.pop(key)[1]
+        self.rows[key] = (frame, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.budget and len(self.rows) > 1:
+            self.nbytes -= self.rows.popitem(last = False)[1][1]
+
+
+    def clear(self, datasets = None):
+
+        """Drop the frames of the given dataset keys, or all frames"""
+
+        for key in list(self.rows):
+            if datasets is None or key[0] in datasets:
+                self.nbytes -= self.rows.pop(key)[1]
+
+
+class AngularStats():
+
+    """Running mean, spread, min and max across phi of an (n_phi, n_bins) quantity.
+
+        Blocks of angles are merged with the pairwise update of Chan et al.,
+        so rows can be folded in as they are computed, in any block size,
+        without keeping them or making a second pass.
+    """
+
+    def __init__(self, axis = None):
+
+        self.axis = axis        # shared x axis of the spectra
+        self.n = 0
+        self.mean = self.M2 = self.min = self.max = None
+
+
+    def update(self, block):
+
+        """Fold an (n, n_bins) block of angles into the statistics"""
+
+        block = np.asarray(block, dtype = float)
+        if len(block) == 0:
+            return
+        nb = len(block)
+        mean = block.mean(axis = 0)
+        M2 = ((block - mean)**2).sum(axis = 0)
+        if self.n == 0:
+            self.mean, self.M2 = mean, M2
+            self.min, self.max = block.min(axis = 0), block.max(axis = 0)
+        else:
+            n = self.n + nb
+            delta = mean - self.mean
+            self.mean = self.mean + delta*nb/n
+            self.M2 = self.M2 + M2 + delta**2*self.n*nb/n
+            np.minimum(self.min, block.min(axis = 0), out = self.min)
+            np.maximum(self.max, block.max(axis = 0), out = self.max)
+        self.n += nb
+
+
+    @property
+    def std(self):
+
+        return np.sqrt(self.M2/self.n) if self.n else None
+
+
+def track_resonance(x, y, mode = 'min'):
+
+    """Position, depth and width of the strongest dip or peak of every row of a spectrum block.
+
+        The extremum of each row is refined by a parabola through it and its
+        two neighbours. Depth is measured from the straight line joining the
+        band edges, width is the full width at half depth with linearly
+        interpolated crossings, NaN where a crossing lies outside the band
+        or the row has no dip (peak) at all. Rows without any finite value,
+        e.g. sample rows of a live scan not computed yet, are NaN throughout.
+
+        *Arguments*
+
+        x : ascending, evenly spaced axis of the band
+        y : (n, len(x)) block of real values, NaN bins are ignored
+        mode : 'min' for dips, 'max' for peaks
+
+        *Returns*
+
+        dict of (n,) arrays 'freq', 'value', 'depth' and 'width'
+    """
+
+    if mode not in ('min', 'max'):
+        raise ValueError(f"mode must be 'min' or 'max', not {mode!r}")
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    if mode == 'max':
+        y = -y                  # peaks are tracked as dips of the negated block
+    n, nb = y.shape
+    if nb < 3:
+        raise ValueError("the band needs at least 3 bins to track a resonance")
+    rows = np.arange(n)
+    empty = np.isnan(y).all(axis = 1)
+    i = np.clip(np.nanargmin(np.where(np.isnan(y), np.inf, y), axis = 1), 1, nb - 2)
+    y0, y1, y2 = y[rows, i - 1], y[rows, i], y[rows, i + 1]
+    curv = y0 - 2*y1 + y2
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        delta = np.clip(np.where(curv > 0, 0.5*(y0 - y2)/curv, 0), -0.5, 0.5)
+    dx = x[1] - x[0]
+    freq = x[i] + delta*dx
+    value = y1 - 0.5*(y0 - y2)*delta + 0.5*curv*delta**2     # parabola at the clipped vertex
+    base = y[:, 0] + (y[:, -1] - y[:, 0])*(freq - x[0])/(x[-1] - x[0])
+    depth = base - value
+    level = (value + depth/2)[:, None]
+    idx = np.arange(nb)
+    above = y >= level
+    left = np.where(above & (idx < i[:, None]), idx, -1).max(axis = 1)
+    right = np.where(above & (idx > i[:, None]), idx, nb).min(axis = 1)
+    found = (left >= 0) & (right < nb) & (depth > 0)
+    left, right = np.clip(left, 0, nb - 2), np.clip(right, 1, nb - 1)
+
+    def crossing(a, b):
+        ya, yb = y[rows, a], y[rows, b]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            t = np.where(yb != ya, (level[:, 0] - ya)/(yb - ya), 0)
+        return x[a] + t*(x[b] - x[a])
+
+    width = np.where(found, crossing(right - 1, right) - crossing(left, left + 1), np.nan)
+    sign = -1 if mode == 'max' else 1
+    res = {'freq': freq, 'value': sign*value, 'depth': depth, 'width': width}
+    for val in res.values():
+        val[empty] = np.nan
+    return res
 
 
 class Analyser():
 
-    def __init__(self):
+    # sample quantities with angular statistics and the key of their x axis
+    statsKeys = {'TR': 'freq', 'pd': 'pd_freq'}
+    # quantities resonances can be tracked in and the key of their x axis
+    trackKeys = {'TR': 'freq', 'FFT': 'freq', 'pd': 'pd_freq'}
+
+
+    def __init__(self, cache = None, lazy = False, budget = 256*2**20, precision = 'double'):
+
+        """
+            *Arguments*
+
+            cache : optional PhiScanCache.ScanCache of processed scans
+            lazy : keep scans memory-mapped from the cache and compute sample
+                    quantities per frame on demand instead of for whole scans
+            budget : resident memory budget in bytes for frames computed in lazy mode
+            precision : 'double', or 'single' to store spectra and results as
+                    float32 / complex64 at half the memory
+        """
+
+        if lazy and cache is None:
+            raise ValueError("lazy frame access needs a ScanCache to map scans from")
+        if precision not in ('double', 'single'):
+            raise ValueError(f"precision must be 'double' or 'single', not {precision!r}")
         self.ml = MenloLoader([])
+        self.ml.precision = precision
+        self.cache = cache
+        self.lazy = lazy
+        self.frames = FrameCache(budget)
         self.files = []
         self.dfDict = {}
         self.referenceDF = None
+        self.referenceKey = None
+        self.sampleCache = {}       # (sample key, reference key) -> sample_results
+        self.carried = {}           # sample key -> (reference source, results) it was loaded with
+        self.mismatched = set()     # sample keys whose spectra do not match the reference
+        self.statsCache = {}        # (sample key, reference key) -> {statsKeys: AngularStats}
+        self.trackCache = {}        # (key, reference key, yKey, band, mode) -> track_resonance result
 
 
+    @profiler.timed('convDF')
     def convDF(self, df):
-        
-        res = pd.DataFrame()
-        df.drop(['freq', 'FFT'], axis = 1, inplace = True)
-        for i in range(len(df)):
-            time  = df.loc[i]['time']
-            amp = df.loc[i]['amp']
 
-            res = pd.concat([res, self.ml.get_FD(time,amp)], axis = 0).reset_index(drop = True)
-        
-        df = pd.concat([res, df], axis = 1) 
+        """Replace the spectra of a loaded dataframe by freshly computed ones"""
+
+        import pandas as pd
+        df.drop(['freq', 'FFT'], axis = 1, inplace = True)
+        res = self.ml.get_FD_rows(list(df['time']), list(df['amp']))
+        df = pd.concat([res, df.reset_index(drop = True)], axis = 1)
         return df
 
 
+    @profiler.timed('convScan')
+    def convScan(self, df):
+
+        """Load a dataframe into a PhiScan and compute its spectra"""
+
+        scan = PhiScan.from_DF(df)
+        res = self.ml.get_FD_batch(scan.time, scan.amp)
+        for key in scan.spectra:
+            setattr(scan, key, res[key])
+        return scan
+
+
+    def loadScan(self, f, phi = None):
+
+        """Read a PhiScan pickle and compute its spectra, or open them from the cache"""
+
+        from PhiScanCache import ScanCache      # imports this module
+        with profiler.stage('source_key'):
+            cacheKey = ScanCache.key(f, self.ml.processing_params())
+        if self.cache is not None:
+            with profiler.stage('cache_load'):
+                scan = self.cache.load(cacheKey)
+            profiler.count('cache_hits' if scan is not None else 'cache_misses')
+            if scan is not None:
+                if phi is not None:
+                    scan.phi = np.asarray(phi, dtype = float)
+                scan.source = cacheKey
+                return scan
+        with profiler.stage('read_pickle'):
+            import pandas as pd         # loaded with the first dataset, not at startup
+            df = pd.read_pickle(f)
+        if phi is not None:
+            df['phi'] = phi
+        scan = self.convScan(df)
+        profiler.snapshot('scan_converted')
+        if self.cache is not None:
+            with profiler.stage('cache_store'):
+                self.cache.store(cacheKey, scan)
+            if self.lazy:
+                # continue from the mapped copy so the computed arrays can be freed
+                scan = self.cache.load(cacheKey)
+                if phi is not None:
+                    scan.phi = np.asarray(phi, dtype = float)
+        scan.source = cacheKey
+        return scan
+
+
+    def add_scan(self, key, scan):
+
+        """Register a processed scan, replacing any cached results of an older one.
+
+            Results a scan already carries, e.g. from PhiScanBatch, are kept
+            with the source of the reference recorded in its meta and reused
+            by update_samples while the reference has that source.
+        """
+
+        self.dfDict[key] = scan
+        self.sampleCache = {k: v for k, v in self.sampleCache.items() if key not in k}
+        self.statsCache = {k: v for k, v in self.statsCache.items() if key not in k}
+        self.trackCache = {k: v for k, v in self.trackCache.items() if key not in k[:2]}
+        self.frames.clear([key])
+        self.carried.pop(key, None)
+        self.mismatched.discard(key)
+        reference = scan.meta.get('reference_source')
+        if scan.TR is not None and reference is not None and len(reference):
+            self.carried[key] = (str(reference[0]), {k: getattr(scan, k) for k in scan.samples})
+        if key == self.referenceKey:
+            self.referenceDF = scan
+
+
+    def set_reference(self, key):
+
+        """Select the dataset all samples are compared against"""
+
+        self.referenceKey = key
+        self.referenceDF = self.dfDict[key]
+
+
+    def update_samples(self):
+
+        """Attach the results against the current reference to every scan.
+
+            Results are computed once per (sample, reference) pair, so adding a
+            sample costs one computation and switching back to an earlier
+            reference none. Results a scan was loaded with are used instead if
+            they were computed against the same reference source. The angular
+            statistics of every pair are folded in at the same time, in lazy
+            mode they are all that is kept. Scans whose spectra do not match
+            the reference (matches_reference) get no results and are listed
+            in mismatched.
+
+            *Returns*
+
+            list of dataset keys whose attached results changed
+        """
+
+        changed = []
+        if self.referenceKey is None:
+            return changed
+        for key, scan in self.dfDict.items():
+            if isinstance(scan, LiveScan):
+                if key != self.referenceKey and scan.reference != self.referenceKey:
+                    self.live_samples(key)
+                    changed.append(key)
+                continue
+            if not self.matches_reference(scan):
+                if key not in self.mismatched:
+                    self.mismatched.add(key)
+                    for k in scan.samples:
+                        setattr(scan, k, None)
+                    changed.append(key)
+                continue
+            self.mismatched.discard(key)
+            cacheKey = (key, self.referenceKey)
+            carried = self.carried.get(key)
+            if cacheKey not in self.sampleCache and carried is not None \
+                    and carried[0] == self.referenceDF.source:
+                self.sampleCache[cacheKey] = carried[1]
+            if self.lazy:
+                self.angular_stats(key)
+                continue
+            if cacheKey not in self.sampleCache:
+                self.sampleCache[cacheKey] = self.sample_results(scan, self.referenceDF)
+                profiler.count('sample_results_computed')
+            self.angular_stats(key)
+            res = self.sampleCache[cacheKey]
+            if scan.TR is not res['TR']:
+                for k, v in res.items():
+                    setattr(scan, k, v)
+                changed.append(key)
+        if changed:
+            profiler.snapshot('samples_attached')
+        return changed
+
+
+    def matches_reference(self, scan):
+
+        """Whether the spectra of scan share the frequency axes of the reference, e.g.
+            not for batch results processed with another resolution or store band"""
+
+        ref = self.referenceDF
+        if ref is None or ref.freq is None or scan.freq is None:
+            return False
+        return ref.freq.shape == scan.freq.shape and ref.p_freq.shape == scan.p_freq.shape \
+            and np.allclose(ref.freq, scan.freq) and np.allclose(ref.p_freq, scan.p_freq)
+
+
+    def append_frame(self, key, phi, time, amp, capacity = 360):
+
+        """Transform one trace of a live acquisition and append it to dataset key.
+
+            Only the new angle is processed: its spectra, its results against
+            the current reference and, once they exist, its contribution to the
+            angular statistics. Earlier angles are left untouched. Once the ring
+            buffer wraps, the statistics are dropped instead and rebuilt from the
+            buffers by angular_stats, as the overwritten angle of the previous
+            rotation cannot be taken out of the accumulators.
+
+            *Arguments*
+
+            key : dataset key, a LiveScan is created on the first frame
+            phi : angle of the trace in deg
+            time, amp : TDS trace as read by read_menlo
+            capacity : ring buffer rows of a new LiveScan
+
+            *Returns*
+
+            (LiveScan, slice of the row the frame was written to)
+
+            *Raises*
+
+            ValueError for a trace rejected by frame_problem
+        """
+
+        problem = self.frame_problem(key, time, amp)
+        if problem is not None:
+            raise ValueError(f"cannot append the trace to {key}: {problem}")
+        scan = self.dfDict.get(key)
+        if not isinstance(scan, LiveScan):
+            scan = LiveScan(capacity)
+            scan.reference = self.referenceKey
+            self.add_scan(key, scan)
+        time, amp = np.asarray(time)[None], np.asarray(amp)[None]
+        res = self.ml.get_FD_batch(time, amp)
+        rows = scan.append(phi, dict(time = time, amp = amp, **{k: res[k] for k in scan.spectra}))
+        ref = self.referenceDF
+        if ref is not None and key != self.referenceKey and scan.reference == self.referenceKey \
+                and rows.start < len(ref):
+            samples = self.sample_results(scan, ref, rows)
+            scan.write(rows, samples)
+            if scan.count > scan.capacity:
+                self.statsCache.pop((key, self.referenceKey), None)
+            for k, stats in self.statsCache.get((key, self.referenceKey), {}).items():
+                stats.update(samples[k])
+        return scan, rows
+
+
+    def frame_problem(self, key, time, amp):
+
+        """Why a live trace cannot be appended to dataset key, None if it can.
+
+            The trace must be finite and have the number of samples and the
+            sampling step of the first trace of the scan. A trace read while
+            the instrument is still writing it fails one of these checks.
+        """
+
+        time, amp = np.asarray(time, dtype = float), np.asarray(amp, dtype = float)
+        if len(amp) < 2 or len(time) != len(amp):
+            return f"{len(amp)} samples"
+        if not (np.isfinite(time).all() and np.isfinite(amp).all()):
+            return "non-finite samples"
+        scan = self.dfDict.get(key)
+        if not isinstance(scan, LiveScan) or not scan.count:
+            return None
+        first = scan.time[0]
+        if len(time) != len(first):
+            return f"{len(time)} samples instead of {len(first)}"
+        if not np.isclose(time[1] - time[0], first[1] - first[0], rtol = 1e-6, atol = 0):
+            return f"sampling step {time[1] - time[0]:g} instead of {first[1] - first[0]:g}"
+        return None
+
+
+    def live_samples(self, key):
+
+        """Recompute the sample rows of a live dataset after the reference changed"""
+
+        scan = self.dfDict[key]
+        scan.drop(scan.samples)
+        scan.reference = self.referenceKey
+        self.statsCache.pop((key, self.referenceKey), None)
+        n = min(len(scan), len(self.referenceDF))
+        if n:
+            scan.write(slice(0, n), self.sample_results(scan, self.referenceDF, slice(0, n)))
+
+
+    def angular_stats(self, key, chunk = 32):
+
+        """Statistics across phi of the sample quantities of a dataset against the current reference.
+
+            Rows are streamed through the accumulators chunk angles at a time,
+            from the cached results or, in lazy mode, computed per chunk from
+            the mapped scan and dropped again.
+
+            *Returns*
+
+            dict of statsKeys -> AngularStats, or None without a reference
+        """
+
+        if self.referenceKey is None:
+            return None
+        cacheKey = (key, self.referenceKey)
+        if cacheKey not in self.statsCache:
+            scan = self.dfDict[key]
+            if not isinstance(scan, LiveScan) and not self.matches_reference(scan):
+                return None
+            res = self.sampleCache.get(cacheKey)
+            n = len(scan)
+            if isinstance(scan, LiveScan):
+                # frames appended later are folded in by append_frame
+                if scan.reference != self.referenceKey or scan.TR is None:
+                    return None
+                res = {k: getattr(scan, k) for k in scan.samples}
+                n = min(n, len(self.referenceDF))
+            stats = {}
+            with profiler.stage('angular_stats'):
+                for start in range(0, n, chunk):
+                    rows = slice(start, min(start + chunk, n))
+                    if res is None:
+                        block = self.sample_results(scan, self.referenceDF, rows)
+                    else:
+                        block = {k: res[k][rows] for k in self.statsKeys}
+                        block['pd_freq'] = res['pd_freq']
+                    for k, xKey in self.statsKeys.items():
+                        if k not in stats:
+                            stats[k] = AngularStats(block.get(xKey, getattr(scan, xKey)))
+                        stats[k].update(block[k])
+            if not stats:
+                return None
+            self.statsCache[cacheKey] = stats
+        return self.statsCache[cacheKey]
+
+
+    def resonances(self, key, yKey = 'TR', band = (0.5, 1.5), mode = 'min', chunk = 32):
+
+        """Track the resonance of a dataset within band at every angle, see track_resonance.
+
+            The whole (phi, band) block is processed in one pass, in lazy mode
+            chunk angles at a time. Results are cached per reference except for
+            live datasets, which grow with every frame.
+
+            *Arguments*
+
+            yKey : tracked quantity, one of trackKeys
+            band : (f0, f1) THz range searched for the resonance
+            mode : 'min' for dips, 'max' for peaks
+
+            *Returns*
+
+            dict of (n_phi,) arrays 'phi', 'freq', 'value', 'depth' and 'width',
+            or None if yKey is not available
+        """
+
+        scan = self.dfDict[key]
+        cacheKey = (key, self.referenceKey, yKey, tuple(band), mode)
+        if cacheKey in self.trackCache:
+            return self.trackCache[cacheKey]
+        n = len(scan)
+        if isinstance(scan, LiveScan) and yKey in scan.samples and scan.TR is not None:
+            n = len(scan.TR)
+        step = chunk if self.lazy else max(n, 1)
+        res, cols = [], None
+        with profiler.stage('track_resonance'):
+            for start in range(0, n, step):
+                x, y = self.frame_rows(key, self.trackKeys[yKey], yKey, start, step)
+                if y is None:
+                    return None
+                if x.ndim > 1:
+                    x = x[0]
+                if cols is None:
+                    cols = slice(int(np.searchsorted(x, min(band))), int(np.searchsorted(x, max(band), side = 'right')))
+                res.append(track_resonance(x[cols], y[:, cols], mode))
+        if not res:
+            return None
+        res = {k: np.concatenate([r[k] for r in res]) for k in res[0]}
+        res['phi'] = np.asarray(scan.phi[:n], dtype = float)
+        if not isinstance(scan, LiveScan):
+            self.trackCache[cacheKey] = res
+        return res
+
+
+    def frame_rows(self, key, xKey, yKey, start, n):
+
+        """Rows start to start + n of the quantity yKey of a dataset.
+
+            In lazy mode sample quantities are computed for just these rows,
+            unless the scan carries them for the current reference,
+            raw quantities are read from the mapped scan.
+
+            *Returns*
+
+            (x, y) with the xKey axis (shared, or one row per frame) and the 
+            (n, n_bins) y block, or (None, None) if yKey is not available
+        """
+
+        scan = self.dfDict[key]
+        rows = slice(start, min(start + n, len(scan)))
+        if yKey in scan.samples and self.lazy and (key, self.referenceKey) not in self.sampleCache:
+            if self.referenceDF is None or not self.matches_reference(scan):
+                return None, None
+            res = self.sample_results(scan, self.referenceDF, rows)
+            x, y = res.get(xKey, getattr(scan, xKey)), res[yKey]
+        else:
+            x, y = getattr(scan, xKey), getattr(scan, yKey)
+            if y is None:
+                return None, None
+            y = y[rows]
+        return (x if x.ndim == 1 else x[rows]), y
+
+
     def correctPhase(self, df):
-        
+
         """Correct low frequency phase error"""
 
         for i in range(len(df)):
-            phase_offset_index = self.ml.find_nearest(df.loc[i]['p_freq'], 0.2)[0]
+            phase_offset_index = nearest_sorted(df.loc[i]['p_freq'], 0.2)
             df.at[i, 'pd'] = df.loc[i]['pd'] - df.loc[i]['pd'][phase_offset_index]
         return df
 
 
+    @profiler.timed('get_samples')
     def get_samples(self, df_m, df_r):
 
         """Calculate quantities for sample against reference and return the result dataframe"""
 
+        if isinstance(df_m, PhiScan):
+            return self.get_samples_scan(df_m, df_r)
+
+        df_m = df_m.copy()
         p_d, tr, c_tr, = [[] for i in range(3)]
 
         for j in range(len(df_m)):
@@ -49,4 +769,39 @@ class Analyser():
         df_m['c_tr'] = c_tr
         df_m = self.ml.unwrp_phase(df_m,'pd')
         df_m = self.correctPhase(df_m)
-        return df_m
\ No newline at end of file
+        return df_m
+
+
+    def get_samples_scan(self, scan_m, scan_r):
+
+        """Same as get_samples for PhiScan objects, computed on whole arrays"""
+
+        for key, val in self.sample_results(scan_m, scan_r).items():
+            setattr(scan_m, key, val)
+        return scan_m
+
+
+    @profiler.timed('sample_results')
+    def sample_results(self, scan_m, scan_r, rows = slice(None)):
+
+        """Phase difference and transmission of a sample against a reference scan.
+
+            Neither scan is modified.
+
+            *Arguments*
+
+            rows : optional slice of angles to compute, all by default
+
+            *Returns*
+
+            dict with the PhiScan.samples keys 'pd_freq', 'pd', 'TR' and 'c_tr'
+        """
+
+        p_d, pd_freq = self.ml.unwrp_phase_batch(scan_m.phase[rows] - scan_r.phase[rows],
+                                                 scan_m.p_freq)
+        phase_offset_index = nearest_sorted(pd_freq, 0.2)
+        # unwrapped in float64, stored in the precision of the spectra
+        return {'pd_freq': pd_freq,
+                'pd': (p_d - p_d[:, phase_offset_index:phase_offset_index+1]).astype(scan_m.phase.dtype, copy = False),
+                'TR': scan_m.FFT[rows]/scan_r.FFT[rows],
+                'c_tr': scan_m.c_FFT[rows]/scan_r.c_FFT[rows]}
@@ -1,8 +1,10 @@
 import sys
 import os
+import time
+startTime = time.perf_counter()     # startup is measured from here, see --startup-time
+import argparse
+from collections import deque
 from numpy import double
-import pandas as pd
-from PyQt5 import uic
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -10,13 +12,170 @@ from PyQt5 import QtSvg
 from pyqtgraph import PlotWidget, graphicsItems, TextItem, mkPen
 from pyqtgraph.graphicsItems.PlotDataItem import PlotDataItem, PlotCurveItem
 import pyqtgraph as pg
-from matplotlib import cm
+from pyqtgraph.graphicsItems.GradientEditorItem import Gradients
 
 
 baseDir =  os.path.dirname(os.path.abspath(__file__))
 sys.path.append(baseDir)
 
 from PhiScanDataModel import *
+from PhiScanCache import ScanCache
+from PhiScanRender import renderSpec, render
+from PhiScanProfiler import profiler
+
+try:
+    from PolDataViewerUI import Ui_MainWindow       # prebuilt from PolDataViewerUI.ui with pyuic5
+except ImportError:
+    Ui_MainWindow = None
+
+importTime = time.perf_counter()
+
+
+def rainbow(x):
+
+    """Colours of the matplotlib 'rainbow' map at positions x in [0, 1], as (n, 4) RGBA in 0 - 255.
+
+        Evaluated from the gnuplot formulae of the map, so the palette needs no
+        matplotlib import.
+    """
+
+    x = np.asarray(x, dtype = float)
+    rgba = np.stack([np.abs(2*x - 0.5), np.sin(np.pi*x), np.cos(np.pi*x/2), np.ones_like(x)], axis = -1)
+    return np.clip(rgba, 0, 1)*255
+
+
+def setupUi(window):
+
+    """Build the widgets of PolDataViewerUI.ui on window.
+
+        The pyuic5 module PolDataViewerUI.py is used whenever it imports, the
+        .ui file is only parsed at runtime without it. The module is kept in
+        sync with the .ui file by regenerating it, see the README.
+    """
+
+    if Ui_MainWindow is not None:
+        ui = Ui_MainWindow()
+        ui.setupUi(window)
+        window.__dict__.update(vars(ui))
+    else:
+        from PyQt5 import uic
+        uic.loadUi(os.path.join(baseDir, "PolDataViewerUI.ui"), window)
+
+
+def decimateCurve(xData, yData, x0, x1, nPixels):
+
+    """Visible part of a curve reduced to its min and max per pixel column.
+
+        *Arguments*
+
+        xData, yData : curve with ascending xData
+        x0, x1 : x range of the view, one point beyond each edge is kept
+        nPixels : width of the view in pixels
+
+        *Returns*
+
+        (x, y) with at most about 2*nPixels points, in the original order
+    """
+
+    i0 = max(int(np.searchsorted(xData, x0)) - 1, 0)
+    i1 = min(int(np.searchsorted(xData, x1, side = 'right')) + 1, len(xData))
+    xData, yData = xData[i0:i1], yData[i0:i1]
+    chunk = len(xData)//max(int(nPixels), 1)
+    if chunk < 4:
+        return xData, yData
+    m = chunk*(len(xData)//chunk)
+    blocks = yData[:m].reshape(-1, chunk)
+    lo, hi = blocks.argmin(axis = 1), blocks.argmax(axis = 1)
+    start = np.arange(0, m, chunk)
+    idx = np.empty(2*len(start), dtype = np.intp)
+    idx[0::2] = start + np.minimum(lo, hi)
+    idx[1::2] = start + np.maximum(lo, hi)
+    idx = np.concatenate([idx, np.arange(m, len(xData))])
+    return xData[idx], yData[idx]
+
+
+def displayValues(yKey, yData):
+
+    """Plotted values of the quantity yKey, the FFT magnitude is shown in dB"""
+
+    if yKey == 'FFT':
+        return 20*np.log(np.abs(yData))
+    return yData
+
+
+class LoaderSignals(QObject):
+
+    """Signals of a LoaderTask, delivered on the GUI thread"""
+
+    progress = pyqtSignal(str, str)                 # file, stage
+    finished = pyqtSignal(int, str, str, object)    # generation, file, key, PhiScan
+    failed = pyqtSignal(int, str, str)              # generation, file, error
+
+
+class LoaderTask(QRunnable):
+
+    """Reads a dropped PhiScan pickle and computes (or reopens cached) spectra off the GUI thread.
+        PhiScanBatch .npz results are opened as they are."""
+
+    phi_vals = np.linspace(90,-90,360)
+
+
+    def __init__(self, analyser, f, generation, cancelled):
+        super().__init__()
+        self.analyser = analyser
+        self.f = f
+        self.generation = generation
+        self.cancelled = cancelled      # callable, True once the generation is stale
+        self.key = os.path.splitext(f.split('/')[-1])[0].split("_")[0]
+        self.signals = LoaderSignals()
+
+
+    def run(self):
+
+        try:
+            if self.cancelled():
+                return
+            self.signals.progress.emit(self.f, "Processing")
+            with profiler.stage('load_dataset', file = self.f):
+                if self.f.endswith(".npz"):
+                    # precomputed by PhiScanBatch
+                    scan = PhiScan.load(self.f)
+                else:
+                    scan = self.analyser.loadScan(self.f, self.phi_vals)
+            profiler.snapshot('dataset_loaded')
+            self.signals.finished.emit(self.generation, self.f, self.key, scan)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, self.f, repr(e))
+
+
+class RenderSignals(QObject):
+
+    """Signals of a RenderTask, delivered on the GUI thread"""
+
+    progress = pyqtSignal(int, int)     # frames done, total
+    finished = pyqtSignal(str)          # video or image sequence path
+    failed = pyqtSignal(str)            # error
+
+
+class RenderTask(QRunnable):
+
+    """Runs PhiScanRender.render for the viewer, its worker processes render the frames"""
+
+    def __init__(self, spec, output, frames):
+        super().__init__()
+        self.spec = spec
+        self.output = output
+        self.frames = frames
+        self.signals = RenderSignals()
+
+
+    def run(self):
+
+        try:
+            path = render(self.spec, self.output, self.frames, progress = self.signals.progress.emit)
+            self.signals.finished.emit(path)
+        except Exception as e:
+            self.signals.failed.emit(repr(e))
 
 
 class PolDataViewerWindow(QMainWindow):
@@ -26,11 +185,32 @@ class PolDataViewerWindow(QMainWindow):
                1.412, 1.604, 1.665, 1.718, 1.764, 1.798, 1.870, 1.921, \
                2.042, 2.076, 2.167, 2.197, 2.224, 2.265, 2.347, 2.367,\
                2.394, 2.464]
+    # plotted (x, y) PhiScan attributes for each measurement of the combo box
+    measurementKeys = {'FFT': ('freq', 'FFT'), 'TR': ('freq', 'TR'),
+                       'TDS': ('time', 'amp'), 'PD': ('pd_freq', 'pd')}
+    # (x1, x2, y1, y2) range, left and bottom labels, title and title colour of each measurement
+    measurementStyles = {'FFT': ((0.53, 1.25, -170, -90), 'Transmission Intensity (dB)', 'Frequency (THz)',
+                                 "Transmission FFT", 'g'),
+                         'TR': ((0.45, 1.55, 0.35, 3), 'Transmission Ratio', 'Frequency (THz)',
+                                "Transmission Ratio", 'r'),
+                         'TDS': ((10, 50, -1.65, 1.25), 'Signal (mV)', 'Time (ps)', "THz - TDS", 'y'),
+                         'PD': ((0.2, 2, -2, 2), 'Phase difference (rad)', 'Frequency (THz)',
+                                "THz - Unwrapped Phase difference", (255,20,147))}
+
 
+    def __init__(self, configFile, lazy = False, memoryBudget = 256, precision = 'double'):
+
+        """
+            *Arguments*
+
+            configFile : path of the viewer configuration
+            lazy : keep datasets memory-mapped and compute frames on demand
+            memoryBudget : resident memory budget in MiB for lazily computed frames
+            precision : 'double', or 'single' to keep spectra as float32 / complex64
+        """
 
-    def __init__(self, configFile):
         super().__init__()
-        self.analyser = Analyser()
+        self.analyser = Analyser(ScanCache(), lazy = lazy, budget = memoryBudget*2**20, precision = precision)
         self.initUI()
         
         self.phi = None
@@ -54,8 +234,10 @@ class PolDataViewerWindow(QMainWindow):
 
         if reply == QMessageBox.Yes:
         
-            self.visTimer.stop()
             self.animationTimer.stop()
+            if self.traceFile:
+                profiler.export(self.traceFile)
+                print(profiler.report())
         
         else:
             event.ignore()    
@@ -76,54 +258,195 @@ class PolDataViewerWindow(QMainWindow):
         """Drop event for file handling"""
 
         files = [u.toLocalFile() for u in event.mimeData().urls()]
+        newFiles = []
         for f in files:
-            if f not in self.analyser.files and f.endswith(".pkl"):
+            if os.path.isdir(f):
+                self.startLive(f)
+            elif f not in self.analyser.files and f.endswith((".pkl", ".npz")):
                 self.analyser.files.append(f)
+                newFiles.append(f)
                 print("Dataset added")
-        self.lblStatus.setText("Status: Processing")
-        self.updateTable() 
-        self.visTimer.start()
+        self.loadFiles(newFiles)
+        self.animationTimer.start()
+
+
+    def startLive(self, directory):
+
+        """Follow an acquisition directory, appending every new Menlo trace as it is written"""
+
+        if self.liveDir:
+            self.liveWatcher.removePath(self.liveDir)
+        self.liveDir = directory
+        self.liveKey = os.path.basename(os.path.normpath(directory)).split("_")[0]
+        self.liveSeen = set()
+        self.liveRetries = {}
+        self.liveWatcher.addPath(directory)
+        print(f"Live mode: {directory} -> {self.liveKey}")
+        self.scanLiveDir()
         self.animationTimer.start()
+
+
+    def scanLiveDir(self):
+
+        """Append the traces written since the last change of the live directory, in name order.
+
+            Only the new frames are transformed, earlier angles are not touched.
+            A trace that does not parse or does not match the earlier ones
+            (Analyser.frame_problem) is retried for liveTimeout seconds, as the
+            instrument may still be writing it, and skipped after that. The first trace
+            sets the expected length, so it is only taken once its file has
+            not changed for liveSettle seconds.
+
+            Angles are assigned in arrival order from the 360 step grid of
+            LoaderTask.phi_vals, as for the rows of a dropped pickle. The file
+            names are not parsed for the angle (get_data2), PhiScanLiveSim
+            numbers its traces by frame instead. A skipped trace therefore
+            shifts the angles of the later ones by one step.
+        """
+
+        row = None
+        for f in sorted(set(self.analyser.ml.find_Menlo(self.liveDir)) - self.liveSeen):
+            try:
+                res = read_menlo(f)
+                problem = self.analyser.frame_problem(self.liveKey, res['time'], res['amp'])
+                if problem is None and not isinstance(self.analyser.dfDict.get(self.liveKey), LiveScan) \
+                        and time.time() - os.path.getmtime(f) < self.liveSettle:
+                    problem = "first trace still changing"
+                if problem is not None:
+                    raise MenloFileError(f, problem)
+            except (MenloFileError, OSError) as e:
+                # most likely still being written, keep the order and retry shortly
+                # counted in time, directory changes of a burst of traces retry it too
+                first = self.liveRetries.setdefault(f, time.time())
+                if time.time() - first < self.liveTimeout:
+                    QTimer.singleShot(100, self.scanLiveDir)
+                    break
+                print(f"invalid data format: {e}")
+                self.liveSeen.add(f)
+                continue
+            self.liveSeen.add(f)
+            scan = self.analyser.dfDict.get(self.liveKey)
+            count = scan.count if isinstance(scan, LiveScan) else 0
+            phi = LoaderTask.phi_vals[count % len(LoaderTask.phi_vals)]
+            isNew = not isinstance(scan, LiveScan)
+            scan, rows = self.analyser.append_frame(self.liveKey, phi, res['time'], res['amp'],
+                                                    capacity = len(LoaderTask.phi_vals))
+            row = rows.start
+            if isNew:
+                self.invalidateDisplayCache([self.liveKey])
+                self.updateTable()
+        if row is not None:
+            self.lblStatus.setText(f"Status: Live {self.liveKey} ({len(self.liveSeen)} traces)")
+            self.showAngle(row)
+            self.updateTracks()
+            # a burst of frames redraws the statistics once
+            if not self.envelopeTimer.isActive():
+                self.envelopeTimer.start()
+
+
+    def loadFiles(self, files):
+
+        """Queue dataset files for processing on the worker pool.
         
+            Files dropped while others are still processing queue behind them,
+            cancelLoading discards everything that has not finished yet.
+        """
+
+        for f in files:
+            task = LoaderTask(self.analyser, f, self.loadGeneration,
+                              lambda gen = self.loadGeneration: gen != self.loadGeneration)
+            task.signals.progress.connect(self.onLoadProgress)
+            task.signals.finished.connect(self.onDatasetLoaded)
+            task.signals.failed.connect(self.onLoadFailed)
+            self.pendingLoads.add(f)
+            self.threadPool.start(task)
+        if self.pendingLoads:
+            self.lblStatus.setText(f"Status: Processing ({len(self.pendingLoads)} queued)")
+
+
+    def cancelLoading(self):
+
+        """Cancel queued and running dataset processing"""
+
+        if not self.pendingLoads:
+            return
+        self.loadGeneration += 1
+        self.threadPool.clear()
+        for f in self.pendingLoads:
+            self.analyser.files.remove(f)
+        print(f"Cancelled {len(self.pendingLoads)} dataset(s)")
+        self.pendingLoads = set()
+        self.lblStatus.setText("Status: Ready")
+
+
+    def onLoadProgress(self, f, stage):
+
+        """Report per file progress of the worker pool"""
+
+        name = os.path.basename(f)
+        self.lblStatus.setText(f"Status: {stage} {name} ({len(self.pendingLoads)} queued)")
+
+
+    def onLoadFailed(self, generation, f, error):
+
+        """Forget a file that could not be processed"""
+
+        if generation != self.loadGeneration:
+            return
+        print(f"invalid data format: {f}\n{error}")
+        self.pendingLoads.discard(f)
+        self.analyser.files.remove(f)
+        if not self.pendingLoads:
+            self.lblStatus.setText("Status: Ready")
+
+
+    def onDatasetLoaded(self, generation, f, key, scan):
+
+        """Add a processed dataset and refresh the table"""
+
+        if generation != self.loadGeneration:
+            return
+        self.pendingLoads.discard(f)
+        self.analyser.add_scan(key, scan)
+        self.datasetFiles[key] = f
+        self.invalidateDisplayCache([key])
+        #if key in ['Reference', 'ref', 'F1', 'F1_reference', 'F1_Reference', 'F1Ref', 'F1ref']:
+        if ("Ref" in key) or ("ref" in key):
+            #always select the last loaded reference as the global reference for future calculations
+            self.analyser.set_reference(key)
+        print("Data added")
+        self.updateTable()
+        if self.pendingLoads:
+            self.lblStatus.setText(f"Status: Processing ({len(self.pendingLoads)} queued)")
+        else:
+            self.lblStatus.setText("Status: Ready")
+
 
     def updateTable(self):
 
         """Update table"""
 
         try:
-            # Load data
-            self.lblStatus.setText("Status: Processing")
-            phi_vals = np.linspace(90,-90,360)
-            for i in range(len(self.analyser.files)):
-                f = self.analyser.files[i]
-                key = f.split('/')[-1].split(".pkl")[0].split("_")[0]
-                
-                self.lblStatus.setText("Status: Processing")
-                self.analyser.dfDict[key] = pd.read_pickle(f)
-                self.analyser.dfDict[key]['phi'] = phi_vals
-                self.analyser.dfDict[key] = self.analyser.convDF(self.analyser.dfDict[key])
-                
-                if len(self.analyser.files) > self.tableWidget.rowCount():
-                    self.tableWidget.insertRow(self.tableWidget.rowCount())
-                    print("Row added", self.tableWidget.rowCount())
-                #if key in ['Reference', 'ref', 'F1', 'F1_reference', 'F1_Reference', 'F1Ref', 'F1ref']:
-                if ("Ref" in key) or ("ref" in key):
-                    #always select the last loaded reference as the global reference for future calculations
-                    self.analyser.referenceDF = self.analyser.dfDict[key]
-              
-                self.lblStatus.setText("Status: Ready")
-                print("Data added")
+            while len(self.analyser.dfDict) > self.tableWidget.rowCount():
+                self.tableWidget.insertRow(self.tableWidget.rowCount())
+                print("Row added", self.tableWidget.rowCount())
+            changed = self.analyser.update_samples()
+            for key in self.analyser.mismatched.intersection(changed):
+                print(f"{key}: spectra do not match the reference {self.analyser.referenceKey} "
+                      "(resolution or store band), TR and PD are not shown")
+            self.invalidateDisplayCache(changed)
             # Prepare plot colors
-            if self.analyser.referenceDF is not None:
-                for key in self.analyser.dfDict:
-                    self.analyser.dfDict[key] = self.analyser.get_samples(self.analyser.dfDict[key], self.analyser.referenceDF)
 
-            palette = cm.get_cmap('rainbow', len(self.analyser.dfDict))
-            self.plotColors = palette(np.linspace(0,1,len(self.analyser.dfDict)))*255
+            self.plotColors = rainbow(np.linspace(0,1,len(self.analyser.dfDict)))
             self.plotColors = np.around(self.plotColors)
+            for row, key in enumerate(self.analyser.dfDict):
+                self.pens[key] = mkPen(color = (self.plotColors[row]), width = self.plotLineWidth)
+                if key in self.plotVisDict:
+                    self.plotVisDict[key].setPen(self.pens[key])
          
-            # Update table
-            for row in range(len(self.analyser.files)):
+            # Update table, rebuilding the items must not toggle curves
+            self.tableWidget.blockSignals(True)
+            for row in range(len(self.analyser.dfDict)):
                
                 
                 self.tableWidget.setItem(row,2,QTableWidgetItem())
@@ -133,7 +456,8 @@ class PolDataViewerWindow(QMainWindow):
                     if col % 3 == 0:
                         item = QTableWidgetItem(f"{list(self.analyser.dfDict.keys())[row]}".format(row,col))
                         item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-                        item.setCheckState(Qt.CheckState.Checked)
+                        item.setCheckState(Qt.CheckState.Checked if self.currentState.get(item.text(), True)
+                                           else Qt.CheckState.Unchecked)
                         self.tableWidget.setItem(row,col,item)
                     if col == 1:
                         # print("F1" not in list(self.analyser.dfDict.keys())[row])
@@ -142,7 +466,15 @@ class PolDataViewerWindow(QMainWindow):
                         else:
                             item = QTableWidgetItem("Reference".format(row,col))
                         self.tableWidget.setItem(row,col,item)
+            self.tableWidget.blockSignals(False)
             self.plotData()
+            for key in changed:
+                if key in self.plotVisDict:
+                    self.showFrame(key)
+            self.updateMap()
+            self.updateEnvelopes()
+            self.updateTracks()
+            profiler.snapshot('table_updated')
 
         except Exception as e:
             print("invalid data format")
@@ -153,11 +485,16 @@ class PolDataViewerWindow(QMainWindow):
 
         """Initialise user interface"""
 
-        uic.loadUi("PolDataViewerUI.ui", self)
+        with profiler.stage('setup_ui'):
+            setupUi(self)
         self.setWindowTitle("THEA PolDataViewer")
         
         self.initAttribs()
+        self.initMap()
+        self.initTracking()
         self.connectEvents()
+        # the defaults were emitted by initAttribs before the validators were connected
+        self.validateEditSpeed()
         self.livePlot.showGrid(x = True, y = True)
         self.labelValue = TextItem('', **{'color': '#FFF'})
         self.labelValue.setPos(QPointF(4,-100))
@@ -169,20 +506,85 @@ class PolDataViewerWindow(QMainWindow):
     
         self.setAcceptDrops(True)
         self.tableWidget.width()
-        self.tableWidget.setToolTip("Drag and drop .pkl PhiScan dataframes")
+        self.tableWidget.setToolTip("Drag and drop .pkl PhiScan dataframes or .npz PhiScanBatch results,\n"
+                                    "or an acquisition directory to follow its Menlo traces live")
         tableHeader  = self.tableWidget.horizontalHeader()
         tableHeader.setSectionResizeMode(1,QHeaderView.ResizeToContents)
         self.lEditSpeed.setAlignment(Qt.AlignCenter) 
         self.lEditPhi.setAlignment(Qt.AlignCenter) 
 
         
-        pixmap = QPixmap('drawing.png')
-        self.graphicLabel.setPixmap(pixmap)
-        self.graphicLabel.setScaledContents(True)
-        self.graphicLabel.show()
+        # the schematic is not part of every UI layout
+        if hasattr(self, 'graphicLabel'):
+            pixmap = QPixmap('drawing.png')
+            self.graphicLabel.setPixmap(pixmap)
+            self.graphicLabel.setScaledContents(True)
+            self.graphicLabel.show()
 
        
      
+    def initMap(self):
+
+        """Floating phi map of the selected dataset, hidden until enabled"""
+
+        self.mapKey = None     # dataset shown in the phi map
+        self.mapPlot = pg.PlotWidget()
+        self.mapPlot.setLabel('left', 'Phi (deg)')
+        self.mapImage = pg.ImageItem()
+        viridis = pg.ColorMap(*zip(*Gradients['viridis']['ticks']))
+        self.mapImage.setLookupTable(viridis.getLookupTable(nPts = 256, alpha = False))
+        self.mapCursor = pg.InfiniteLine(angle = 0, pen = mkPen((255,255,255,180), width = 1))
+        self.mapPlot.addItem(self.mapImage)
+        self.mapPlot.addItem(self.mapCursor)
+        self.mapDock = QDockWidget("Phi map", self)
+        self.mapDock.setWidget(self.mapPlot)
+        self.mapDock.setFeatures(QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetFloatable)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.mapDock)
+        self.mapDock.setFloating(True)
+        self.mapDock.resize(700, 450)
+        self.mapDock.hide()
+
+
+    def initTracking(self):
+
+        """Floating resonance frequency, depth and width plots vs phi, hidden until enabled"""
+
+        self.trackCurves = {}   # dataset key -> frequency, depth and width curves
+        self.trackBand = pg.LinearRegionItem((0.8, 1.0), brush = (255, 255, 255, 30))
+        self.trackBand.setZValue(-2)
+        self.trackMode = QComboBox()
+        self.trackMode.addItems(["dips", "peaks"])
+        self.trackExport = QPushButton("export")
+        self.trackPlots = pg.GraphicsLayoutWidget()
+        self.trackCursors = []
+        for row, label in enumerate(("Frequency (THz)", "Depth", "Width (THz)")):
+            plot = self.trackPlots.addPlot(row = row, col = 0)
+            plot.setLabel('left', label)
+            plot.showGrid(x = True, y = True)
+            if row:
+                plot.setXLink(self.trackPlots.getItem(0, 0))
+            cursor = pg.InfiniteLine(angle = 90, pen = mkPen((255,255,255,180), width = 1))
+            plot.addItem(cursor)
+            self.trackCursors.append(cursor)
+        plot.setLabel('bottom', 'Phi (deg)')
+        bar = QHBoxLayout()
+        bar.addWidget(QLabel("track"))
+        bar.addWidget(self.trackMode)
+        bar.addStretch()
+        bar.addWidget(self.trackExport)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.addLayout(bar)
+        layout.addWidget(self.trackPlots)
+        self.trackDock = QDockWidget("Resonance tracking", self)
+        self.trackDock.setWidget(widget)
+        self.trackDock.setFeatures(QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetFloatable)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.trackDock)
+        self.trackDock.setFloating(True)
+        self.trackDock.resize(500, 600)
+        self.trackDock.hide()
+
+
     def rescalePlot(self, x1,x2,px,y1,y2,py):
         
         """Sets the plot axes"""
@@ -211,15 +613,40 @@ class PolDataViewerWindow(QMainWindow):
         self.labelValue.setPos(QPointF(4,-100))
 
         self.plotVisDict = {} # dictionary for visibility status
-        self.visTimer = QTimer(self)
-        self.visTimer.setInterval(20)
+        self.curveData = {}   # curve id -> full resolution (x, y) of the shown frame
+        self.envelopes = {}   # dataset key -> (fill items, [(curve item, x, y)]) of its angular statistics
+        self.displayCache = {} # dataset key -> (x, y matrix) of the selected measurement
+        self.lookahead = 16    # frames computed per miss in lazy mode
+        self.mapChunk = 32     # angles computed at a time for the phi map in lazy mode
+        self.mapColumns = 2048 # x bins of the phi map image in lazy mode
+        self.fpsOverlay = TextItem('', **{'color': '#0F0'})
+        self.lastFrameTime = None
+        self.frameIntervals = deque(maxlen = 50)
+        self.droppedFrames = 0
+        self.traceFile = None  # stage timings are exported here on shutdown
+        self.threadPool = QThreadPool.globalInstance()
+        self.renderPool = QThreadPool(self)    # kept apart, cancelLoading clears threadPool
+        self.loadGeneration = 0        # bumped to cancel in-flight dataset processing
+        self.pendingLoads = set()      # files queued or running on the thread pool
+        self.datasetFiles = {}         # dataset key -> file it was loaded from
+        self.liveWatcher = QFileSystemWatcher(self)
+        self.liveDir = None            # acquisition directory followed in live mode
+        self.liveKey = None
+        self.liveSeen = set()          # traces of liveDir already appended
+        self.liveRetries = {}          # trace -> time of its first failed read, while it is being written
+        self.liveTimeout = 1.0         # s a failing trace is retried before it is skipped
+        self.liveSettle = 0.3          # s without changes before the first live trace is taken
+        self.envelopeTimer = QTimer(self)      # throttles the statistics redraw of live frames
+        self.envelopeTimer.setSingleShot(True)
+        self.envelopeTimer.setInterval(250)
         self.animationTimer = QTimer(self)
         self.lEditSpeed.setText("25")
         self.lEditSpeed.editingFinished.emit()
         self.lEditPhi.setText("90")
         self.lEditPhi.editingFinished.emit()
         self.btnPlay.setCheckable(True)
-        self.currentState, self.previousState = [{} for i in range(2)]
+        self.currentState = {} # curve id -> shown, follows the table check boxes
+        self.pens = {}         # dataset key -> pen in its table colour
         self.lEditPhi.setReadOnly(True)
         self.waterLines = []
 
@@ -233,11 +660,296 @@ class PolDataViewerWindow(QMainWindow):
         self.comboBoxMeasurement.activated.connect(self.selectMeasurement)
         self.lEditSpeed.editingFinished.connect(self.validateEditSpeed)
         self.checkBoxWaterLines.toggled.connect(self.toggleWaterLines)
-        self.visTimer.timeout.connect(self.checkVisibilityFlags)
+        self.tableWidget.itemChanged.connect(self.onItemChanged)
+        self.liveWatcher.directoryChanged.connect(self.scanLiveDir)
+        self.envelopeTimer.timeout.connect(self.refreshLiveEnvelopes)
         self.animationTimer.timeout.connect(self.refreshPlot)
         self.btnPlay.clicked.connect(self.playScan)
+        QShortcut(QKeySequence(Qt.Key_Escape), self, activated = self.cancelLoading)
+        QShortcut(QKeySequence("Ctrl+T"), self, activated = self.exportTrace)
+        QShortcut(QKeySequence("Ctrl+E"), self, activated = self.exportDatasets)
+        QShortcut(QKeySequence("Ctrl+R"), self, activated = self.renderAnimation)
+        self.checkBoxFps.toggled.connect(self.toggleFpsOverlay)
+        self.checkBoxMap.toggled.connect(self.toggleMap)
+        self.checkBoxStats.toggled.connect(self.updateEnvelopes)
+        self.checkBoxTrack.toggled.connect(self.toggleTracking)
+        self.trackBand.sigRegionChangeFinished.connect(self.updateTracks)
+        self.trackMode.currentIndexChanged.connect(self.updateTracks)
+        self.trackExport.clicked.connect(self.exportResonances)
+        self.trackPlots.scene().sigMouseClicked.connect(self.jumpToTrackAngle)
+        self.tableWidget.currentCellChanged.connect(self.selectMapDataset)
+        self.mapPlot.scene().sigMouseClicked.connect(self.jumpToAngle)
+        self.livePlot.getViewBox().sigXRangeChanged.connect(self.refineCurves)
+        self.livePlot.getViewBox().sigResized.connect(self.refineCurves)
         
 
+    def toggleFpsOverlay(self):
+
+        """Frame rate overlay toggle view"""
+
+        if self.checkBoxFps.isChecked():
+            self.livePlot.addItem(self.fpsOverlay)
+        else:
+            self.livePlot.removeItem(self.fpsOverlay)
+
+
+    def toggleMap(self):
+
+        """Phi map toggle view"""
+
+        self.mapDock.setVisible(self.checkBoxMap.isChecked())
+        self.updateMap()
+
+
+    def selectMapDataset(self, row, col, prevRow, prevCol):
+
+        """Show the dataset of the selected table row in the phi map"""
+
+        item = self.tableWidget.item(row, 0)
+        if item is not None and item.text() != self.mapKey:
+            self.mapKey = item.text()
+            self.updateMap()
+
+
+    def updateMap(self):
+
+        """Render the whole scan of the map dataset as one phi x frequency (or time) image"""
+
+        if not self.mapDock.isVisible() or not self.analyser.dfDict:
+            return
+        if self.mapKey not in self.analyser.dfDict:
+            self.mapKey = next(iter(self.analyser.dfDict))
+        scan = self.analyser.dfDict[self.mapKey]
+        if isinstance(scan, LiveScan):
+            xData, yData = self.displayData(scan)
+        elif self.analyser.lazy:
+            xData, yData = self.lazyMap(self.mapKey)
+        else:
+            if self.mapKey not in self.displayCache:
+                self.displayCache[self.mapKey] = self.displayData(scan)
+            xData, yData = self.displayCache[self.mapKey]
+        if yData is None:
+            self.mapImage.clear()
+            return
+        if xData.ndim > 1:
+            xData = xData[0]
+        # image columns are the x axis, rows the angles
+        finite = yData[::4, ::4][np.isfinite(yData[::4, ::4])]
+        levels = np.percentile(finite, [1, 99]) if finite.size else (0, 1)
+        self.mapImage.setImage(np.asarray(yData).T, levels = levels)
+        dx = (xData[-1] - xData[0])/max(len(xData) - 1, 1)
+        dphi = (scan.phi[-1] - scan.phi[0])/max(len(scan) - 1, 1)
+        self.mapImage.setRect(QRectF(xData[0] - dx/2, scan.phi[0] - dphi/2,
+                                     dx*len(xData), dphi*len(scan)))
+        self.mapPlot.setLabel('bottom', self.livePlot.getAxis('bottom').labelText)
+        self.mapPlot.setXRange(*self.livePlot.getViewBox().viewRange()[0], padding = 0)
+        self.mapPlot.setTitle(f"{self.mapKey} {self.comboBoxMeasurement.currentText()}")
+        self.mapCursor.setValue(scan.phi[min(self.phi_idx, len(scan) - 1)])
+
+
+    def jumpToAngle(self, evt):
+
+        """Show the angle of the phi map row under a click in the phi map"""
+
+        if self.mapKey not in self.analyser.dfDict:
+            return
+        pos = self.mapPlot.getViewBox().mapSceneToView(evt.scenePos())
+        phi = self.analyser.dfDict[self.mapKey].phi
+        self.showAngle(int(np.argmin(np.abs(phi - pos.y()))))
+
+
+    def showAngle(self, idx):
+
+        """Draw every shown curve at angle index idx"""
+
+        self.phi_idx = idx
+        for key in self.plotVisDict:
+            self.showFrame(key)
+        scan = self.analyser.dfDict.get(self.mapKey if self.mapKey in self.analyser.dfDict
+                                        else next(iter(self.plotVisDict), None))
+        if scan is None or idx >= len(scan):
+            return
+        currentPhi = f"{scan.phi[idx]:.2f}"
+        self.labelValue.setText(f"""Data: {idx}/360\nPhi: {currentPhi} deg""")
+        self.lEditPhi.setText(currentPhi)
+        self.mapCursor.setValue(scan.phi[idx])
+        for cursor in self.trackCursors:
+            cursor.setValue(scan.phi[idx])
+
+
+    def toggleTracking(self):
+
+        """Resonance tracking toggle view, the band starts in the middle of the shown range"""
+
+        if self.checkBoxTrack.isChecked():
+            (x0, x1) = self.livePlot.getViewBox().viewRange()[0]
+            f0, f1 = self.trackBand.getRegion()
+            if f0 < x0 or f1 > x1:
+                self.trackBand.setRegion((x0 + 0.4*(x1 - x0), x0 + 0.6*(x1 - x0)))
+            self.livePlot.addItem(self.trackBand)
+        else:
+            self.livePlot.removeItem(self.trackBand)
+        self.trackDock.setVisible(self.checkBoxTrack.isChecked())
+        self.updateTracks()
+
+
+    def updateTracks(self):
+
+        """Track the resonance in the selected band across phi for every dataset of the plot"""
+
+        plots = [self.trackPlots.getItem(row, 0) for row in range(3)]
+        results = {}
+        if self.trackDock.isVisible() and self.yKey in self.analyser.trackKeys:
+            band = self.trackBand.getRegion()
+            mode = 'max' if self.trackMode.currentText() == "peaks" else 'min'
+            for key in self.plotVisDict:
+                res = self.analyser.resonances(key, self.yKey, band, mode)
+                if res is not None:
+                    results[key] = res
+        for key in [k for k in self.trackCurves if k not in results]:
+            for plot, curve in zip(plots, self.trackCurves.pop(key)):
+                plot.removeItem(curve)
+        # the curves of a dataset are kept and refilled, e.g. for every live frame
+        for key, res in results.items():
+            if key not in self.trackCurves:
+                self.trackCurves[key] = [plot.plot(connect = 'finite') for plot in plots]
+            for curve, q in zip(self.trackCurves[key], ('freq', 'depth', 'width')):
+                curve.setData(res['phi'], res[q])
+                curve.setPen(self.pens[key])
+                curve.setVisible(self.currentState[key])
+
+
+    def jumpToTrackAngle(self, evt):
+
+        """Show the angle under a click in the resonance tracking plots"""
+
+        scan = self.analyser.dfDict.get(next(iter(self.trackCurves), None))
+        if scan is None:
+            return
+        pos = self.trackPlots.getItem(0, 0).getViewBox().mapSceneToView(evt.scenePos())
+        self.showAngle(int(np.argmin(np.abs(scan.phi - pos.x()))))
+
+
+    def exportResonances(self):
+
+        """Save the resonance tracked in the selected band for the plotted datasets as CSV"""
+
+        if self.yKey not in self.analyser.trackKeys:
+            QMessageBox.warning(self, "Export resonances", "Resonances are tracked in FFT, TR and PD only")
+            return
+        path = QFileDialog.getSaveFileName(self, "Export resonances", "resonances.csv", "CSV (*.csv)")[0]
+        if path:
+            from PhiScanExport import export_resonances
+            export_resonances(self.analyser, path, self.yKey, self.trackBand.getRegion(),
+                              'max' if self.trackMode.currentText() == "peaks" else 'min',
+                              keys = list(self.plotVisDict))
+
+
+    def trackFrameRate(self):
+
+        """Update actual fps and dropped frame count from the time between animation ticks"""
+
+        now = time.perf_counter()
+        if self.lastFrameTime is not None:
+            interval = now - self.lastFrameTime
+            target = self.animationTimer.interval()/1000
+            self.frameIntervals.append(interval)
+            if target <= 0:
+                self.lastFrameTime = now
+                return
+            if interval > 1.5*target:
+                dropped = int(round(interval/target)) - 1
+                self.droppedFrames += dropped
+                profiler.count('dropped_frames', dropped)
+            if self.checkBoxFps.isChecked():
+                fps = len(self.frameIntervals)/sum(self.frameIntervals)
+                self.fpsOverlay.setText(f"fps: {fps:.1f} / {1/target:.0f}\ndropped: {self.droppedFrames}")
+        self.lastFrameTime = now
+
+
+    def exportTrace(self):
+
+        """Save the recorded stage timings as JSON"""
+
+        path = QFileDialog.getSaveFileName(self, "Export trace", "phiscan_trace.json", "JSON (*.json)")[0]
+        if path:
+            profiler.export(path)
+            print(profiler.report())
+
+
+    def reportStartup(self, quit = False):
+
+        """Record the time from the start of the viewer import to the window being shown.
+
+            *Arguments*
+
+            quit : exit afterwards, writing the trace file if one is set
+        """
+
+        now = time.perf_counter()
+        profiler.record('startup_imports', startTime, importTime - startTime)
+        profiler.record('startup', startTime, now - startTime)
+        profiler.snapshot('startup')
+        print(f"Startup: {(now - startTime)*1e3:.0f} ms, imports {(importTime - startTime)*1e3:.0f} ms")
+        if quit:
+            if self.traceFile:
+                profiler.export(self.traceFile)
+                print(profiler.report())
+            QApplication.quit()
+
+
+    def exportDatasets(self):
+
+        """Save the loaded datasets and their results as chunked, compressed HDF5 or Parquet"""
+
+        path, fileType = QFileDialog.getSaveFileName(self, "Export datasets", "phiscan.h5",
+                                                     "HDF5 (*.h5);;Parquet directory (*)")
+        if not path:
+            return
+        from PhiScanExport import export_hdf5, export_parquet
+        self.lblStatus.setText("Status: Exporting")
+        try:
+            if fileType.startswith("HDF5"):
+                export_hdf5(self.analyser, path)
+            else:
+                export_parquet(self.analyser, path)
+        except ImportError as e:
+            QMessageBox.warning(self, "Export datasets", str(e))
+        self.lblStatus.setText("Status: Ready")
+
+
+    def renderAnimation(self):
+
+        """Render every angle of the current plot offscreen to a video or PNG sequence.
+
+            Datasets, colours, axis ranges and water lines are taken from the 
+            window, live datasets are left out as they have no file.
+        """
+
+        path, fileType = QFileDialog.getSaveFileName(self, "Render animation", "phiscan.mp4",
+                                                     "Video (*.mp4);;PNG sequence directory (*)")
+        if not path:
+            return
+        files = {k: f for k, f in self.datasetFiles.items() if k in self.analyser.dfDict
+                 and not isinstance(self.analyser.dfDict[k], LiveScan)}
+        visible = [k for k in files if self.currentState.get(k)]
+        if not visible:
+            return
+        viewBox = self.livePlot.getViewBox()
+        xRange, yRange = viewBox.viewRange()
+        spec = renderSpec(files, self.analyser.referenceKey if self.analyser.referenceKey in files else None,
+                          self.comboBoxMeasurement.currentText(),
+                          colors = {k: self.pens[k].color().getRgb() for k in files}, visible = visible,
+                          xRange = xRange, yRange = yRange, waterLines = self.checkBoxWaterLines.isChecked(),
+                          params = self.analyser.ml.processing_params(),
+                          cacheDir = self.analyser.cache.cacheDir if self.analyser.cache else None)
+        task = RenderTask(spec, path, max(len(self.analyser.dfDict[k]) for k in visible))
+        task.signals.progress.connect(lambda done, total: self.lblStatus.setText(f"Status: Rendering {done}/{total}"))
+        task.signals.finished.connect(lambda out: self.lblStatus.setText(f"Status: Rendered {os.path.basename(out)}"))
+        task.signals.failed.connect(lambda error: QMessageBox.warning(self, "Render animation", error))
+        self.renderPool.start(task)
+
+
     def toggleWaterLines(self):
 
         """Waterlines overlay toggle view"""
@@ -269,159 +981,322 @@ class PolDataViewerWindow(QMainWindow):
 
         """Update plot"""
 
+        frameStart = time.perf_counter()
+        self.trackFrameRate()
         lblSceneX = self.livePlot.getViewBox().state['targetRange'][0][0] + np.abs(self.livePlot.getViewBox().state['targetRange'][0][1] - self.livePlot.getViewBox().state['targetRange'][0][0])*0.80
         lblSceneY =  self.livePlot.getViewBox().state['targetRange'][1][0] + np.abs(self.livePlot.getViewBox().state['targetRange'][1][1] - self.livePlot.getViewBox().state['targetRange'][1][0])*0.95
         self.labelValue.setPos(QPointF(lblSceneX,lblSceneY))
+        self.fpsOverlay.setPos(QPointF(self.livePlot.getViewBox().state['targetRange'][0][0], lblSceneY))
         self.lblStatus.setText("Status: Busy")
         if self.currentState:        
             self.phi_idx += 1
             
-            if self.phi_idx == 359:
+            if self.phi_idx >= 359:         # also after a live frame was shown at 359
                 self.phi_idx = 0
-            ckey = self.comboBoxMeasurement.currentText()
-            if ckey == "FFT" :
-                self.xKey = 'freq' 
-                self.yKey = ckey
-            if ckey == "TR" :
-                self.xKey = 'freq' 
-                self.yKey = ckey
-            if ckey == 'PD':
-                self.xKey = 'p_freq'
-                self.yKey = 'pd'
-            if ckey == 'TDS':
-                self.xKey = 'time'
-                self.yKey = 'amp'
             for key in self.plotVisDict:
-                currentPhi = f"{self.analyser.dfDict[key].loc[self.phi_idx]['phi']:.2f}"    
-                if ckey == 'FFT':
-
-                    xData = self.analyser.dfDict[key].loc[self.phi_idx][self.xKey]
-                    yData = 20*np.log(np.abs(self.analyser.dfDict[key].loc[self.phi_idx][self.yKey]))
-                else:
-                    xData = self.analyser.dfDict[key].loc[self.phi_idx][self.xKey]
-                    yData = self.analyser.dfDict[key].loc[self.phi_idx][self.yKey]
-
+                if not self.currentState[key]:
+                    continue
+                xData, yData = self.displayFrame(key, self.phi_idx)
+                if yData is None:
+                    self.clearCurve(key)
+                    continue
+                currentPhi = f"{self.analyser.dfDict[key].phi[self.phi_idx]:.2f}"    
                 self.setValues(key, xData, yData)
                 self.labelValue.setText(f"""Data: {self.phi_idx}/360\nPhi: {currentPhi} deg""")
                 self.lEditPhi.setText(f"{currentPhi}")
+            if self.mapKey in self.analyser.dfDict and self.mapDock.isVisible() \
+                    and self.phi_idx < len(self.analyser.dfDict[self.mapKey]):
+                self.mapCursor.setValue(self.analyser.dfDict[self.mapKey].phi[self.phi_idx])
+            if self.trackCurves and self.trackDock.isVisible():
+                for cursor in self.trackCursors:
+                    cursor.setValue(float(self.lEditPhi.text()))
+        profiler.record('frame', frameStart, time.perf_counter() - frameStart)
                 
 
     def plotData(self):
 
         """Plot data, create curves"""
 
-        ckey = self.comboBoxMeasurement.currentText()
-        if (ckey == "FFT") or (ckey == "TR"):
-            self.xKey = 'freq' 
-            self.yKey = ckey
-        if ckey == 'PD':
-            self.xKey = 'p_freq' 
-            self.yKey = 'pd'
-        elif ckey == "TDS":
-            self.xKey = 'time'
-            self.yKey = 'amp'
         print("Looping through data dict")
-        for k in range(len(self.analyser.dfDict)):
-            key = list(self.analyser.dfDict.keys())[k]
-            pen = mkPen(color = (self.plotColors[k]), width = self.plotLineWidth)
-            if ckey == 'FFT':
-                xData = self.analyser.dfDict[key].loc[self.phi_idx][self.xKey]
-                yData = 20*np.log(np.abs(self.analyser.dfDict[key].loc[self.phi_idx][self.yKey]))
-            else:
-                xData = self.analyser.dfDict[key].loc[self.phi_idx][self.xKey]
-                yData = self.analyser.dfDict[key].loc[self.phi_idx][self.yKey]
+        for key in self.analyser.dfDict:
             print("Current key and plot item")
             print(key, self.plotVisDict)
             if key not in self.plotVisDict.keys():
-                self.addCurve(key,pen)
+                self.addCurve(key, self.pens[key])
                 print("Curve Added")
-                self.setValues(key, xData, yData)          
-                self.currentState[key] = True
-            self.previousState[key] = self.currentState[key]
+                self.showFrame(key)
+
+
+    def showFrame(self, key):
+
+        """Draw the current angle of a shown curve, e.g. while the animation is paused"""
+
+        if self.currentState[key]:
+            xData, yData = self.displayFrame(key, self.phi_idx)
+            if yData is not None:
+                self.setValues(key, xData, yData)
+            else:
+                self.clearCurve(key)
           
             
+    def displayFrame(self, key, idx):
+
+        """Plot ready (x, y) data of dataset key at angle index idx"""
+
+        scan = self.analyser.dfDict[key]
+        if isinstance(scan, LiveScan):
+            # rows keep arriving, only the requested one is converted
+            if getattr(scan, self.yKey) is None or idx >= len(scan):
+                return None, None
+            xData, yData = self.displayData(scan, slice(idx, idx + 1))
+            return (xData if xData.ndim == 1 else xData[0]), yData[0]
+        if self.analyser.lazy:
+            return self.lazyFrame(key, idx)
+        if key not in self.displayCache:
+            self.displayCache[key] = self.displayData(self.analyser.dfDict[key])
+        xData, yData = self.displayCache[key]
+        if yData is None:
+            return None, None
+        if xData.ndim > 1:
+            xData = xData[idx]
+        return xData, yData[idx]
+
+
+    def lazyFrame(self, key, idx):
+
+        """Plot ready frame of a memory-mapped dataset.
+
+            On a miss the frame and the next few the animation will show are
+            computed in one batch and kept in the analyser's frame budget.
+        """
+
+        frameKey = (key, self.analyser.referenceKey, self.yKey, idx)
+        frame = self.analyser.frames.get(frameKey)
+        if frame is not None:
+            return frame
+        xData, yData = self.analyser.frame_rows(key, self.xKey, self.yKey, idx, self.lookahead)
+        if yData is None:
+            return None, None
+        yData = np.array(displayValues(self.yKey, yData))
+        for i in range(len(yData)):
+            x = xData if xData.ndim == 1 else np.array(xData[i])
+            nbytes = yData[i].nbytes + (x.nbytes if xData.ndim > 1 else 0)
+            self.analyser.frames.put(frameKey[:3] + (idx + i,), (x, yData[i]), nbytes)
+        return self.analyser.frames.get(frameKey)
+
+
+    def lazyMap(self, key):
+
+        """Phi map image of a memory-mapped dataset.
+
+            Rows are computed mapChunk angles at a time and written into one
+            preallocated float32 image, with the x bins averaged down to at most
+            mapColumns. The image is kept in the analyser's frame budget per
+            (dataset, reference, measurement).
+        """
+
+        mapKey = (key, self.analyser.referenceKey, self.yKey, 'map')
+        image = self.analyser.frames.get(mapKey)
+        if image is not None:
+            return image
+        n = len(self.analyser.dfDict[key])
+        for start in range(0, n, self.mapChunk):
+            xData, yData = self.analyser.frame_rows(key, self.xKey, self.yKey, start, self.mapChunk)
+            if yData is None:
+                return None, None
+            if start == 0:
+                x = xData if xData.ndim == 1 else np.asarray(xData[0])
+                step = -(-yData.shape[1]//self.mapColumns)
+                cols = yData.shape[1]//step
+                x = x[:cols*step].reshape(cols, step).mean(axis = 1)
+                image = np.empty((n, cols), dtype = np.float32)
+            block = displayValues(self.yKey, yData[:, :cols*step])
+            image[start:start + len(block)] = block.reshape(len(block), cols, step).mean(axis = 2)
+        self.analyser.frames.put(mapKey, (x, image), x.nbytes + image.nbytes)
+        return x, image
+
+
+    def displayData(self, scan, rows = slice(None)):
+
+        """Compute the (x axis, y matrix) of a scan for the selected measurement"""
+
+        xData, yData = getattr(scan, self.xKey), getattr(scan, self.yKey)
+        if yData is None:
+            return xData, None
+        yData = displayValues(self.yKey, yData[rows])
+        return (xData if xData.ndim == 1 else xData[rows]), yData
+
+
+    def invalidateDisplayCache(self, keys = None):
+
+        """Drop precomputed display data after the data, reference or measurement changed"""
+
+        self.analyser.frames.clear(keys)
+        if keys is None:
+            self.displayCache = {}
+        for key in keys or []:
+            self.displayCache.pop(key, None)
+
+
     def addCurve(self, curve_id, pen):
         
         """Add curve"""
 
         plot = self.livePlot.plot(name=curve_id, pen=pen)
         self.plotVisDict[curve_id] = plot
-        self.currentState[curve_id] = True
-        self.previousState[curve_id] = False
+        self.currentState.setdefault(curve_id, True)
+        plot.setVisible(self.currentState[curve_id])
 
 
-    def removeCurve(self, curve_id):
-        
-        """Remove curve"""
+    def setValues(self, curve_id, xData, yData):
 
-        curve_id = str(curve_id)
+        """Set curve data, drawn at the resolution of the current view"""
 
-        if curve_id in self.plotVisDict:
-            self.livePlot.removeItem(self.plotVisDict[curve_id])
-            
-            self.livePlot.clear()
-            self.currentState[curve_id] = False
-            self.previousState[curve_id] = True
-            self.plotVisDict.pop(curve_id, None)
-            self.livePlot.show()
+        self.curveData[curve_id] = (xData, yData)
+        self.drawCurve(curve_id)
 
 
-    def setValues(self, curve_id, xData, yData):
+    def clearCurve(self, curve_id):
 
-        """Set curve data"""
+        """Empty a curve whose dataset has nothing to show for the measurement"""
 
-        curve = self.plotVisDict[curve_id]
-        curve.setData(xData, yData)
+        if self.curveData.pop(curve_id, None) is not None:
+            self.plotVisDict[curve_id].setData([], [])
 
 
-    def checkVisibilityFlags(self):
+    def drawCurve(self, curve_id):
 
-        """Check table checkboxes to show/hide plot items"""
+        """Hand the visible, per pixel decimated part of a curve to pyqtgraph"""
+
+        viewBox = self.livePlot.getViewBox()
+        (x0, x1), nPixels = viewBox.viewRange()[0], viewBox.width() or 1000
+        xData, yData = self.curveData[curve_id]
+        self.plotVisDict[curve_id].setData(*decimateCurve(xData, yData, x0, x1, nPixels))
+
+
+    def refineCurves(self):
+
+        """Redraw the shown frame after zooming, panning or resizing"""
+
+        for key in self.plotVisDict:
+            if self.currentState[key] and key in self.curveData:
+                self.drawCurve(key)
+        viewBox = self.livePlot.getViewBox()
+        (x0, x1), nPixels = viewBox.viewRange()[0], viewBox.width() or 1000
+        for fills, curves in self.envelopes.values():
+            for curve, xData, yData in curves:
+                curve.setData(*decimateCurve(xData, yData, x0, x1, nPixels))
+
+
+    def updateEnvelopes(self):
+
+        """Overlay the angular min/max and mean +/- std bands of every dataset for TR and PD"""
+
+        for fills, curves in self.envelopes.values():
+            for item in fills + [c[0] for c in curves]:
+                self.livePlot.removeItem(item)
+        self.envelopes = {}
+        if not self.checkBoxStats.isChecked() or self.yKey not in self.analyser.statsKeys:
+            return
+        for key in self.plotVisDict:
+            stats = self.analyser.angular_stats(key)
+            if stats is None:
+                continue
+            s = stats[self.yKey]
+            color = self.pens[key].color()
+            fills, curves = [], []
+            for lo, hi, alpha in self.envelopeBands(s):
+                pair = (PlotCurveItem(pen = None), PlotCurveItem(pen = None))
+                fills.append(pg.FillBetweenItem(*pair, brush = (color.red(), color.green(), color.blue(), alpha)))
+                curves += [(pair[0], s.axis, lo), (pair[1], s.axis, hi)]
+            for item in fills + [c[0] for c in curves]:
+                self.livePlot.addItem(item)
+                item.setZValue(-1)
+                item.setVisible(self.currentState[key])
+            self.envelopes[key] = (fills, curves)
+        self.refineCurves()
+
+
+    def refreshLiveEnvelopes(self):
+
+        """Redraw the statistics of the live dataset with the frames appended since, reusing its items"""
+
+        key = self.liveKey
+        if key not in self.plotVisDict or not self.checkBoxStats.isChecked() \
+                or self.yKey not in self.analyser.statsKeys:
+            return
+        stats = self.analyser.angular_stats(key)
+        if stats is None:
+            return
+        if key not in self.envelopes:
+            # the first statistics of the dataset, e.g. once a reference is loaded
+            self.updateEnvelopes()
+            return
+        s = stats[self.yKey]
+        fills, curves = self.envelopes[key]
+        bounds = [y for lo, hi, alpha in self.envelopeBands(s) for y in (lo, hi)]
+        self.envelopes[key] = (fills, [(curve, s.axis, y) for (curve, x, old), y in zip(curves, bounds)])
+        viewBox = self.livePlot.getViewBox()
+        (x0, x1), nPixels = viewBox.viewRange()[0], viewBox.width() or 1000
+        for curve, xData, yData in self.envelopes[key][1]:
+            curve.setData(*decimateCurve(xData, yData, x0, x1, nPixels))
+
+
+    @staticmethod
+    def envelopeBands(s):
+
+        """(lower, upper, alpha) of the min/max and mean +/- std bands of an AngularStats"""
+
+        return ((s.min, s.max, 40), (s.mean - s.std, s.mean + s.std, 90))
+
+
+    def onItemChanged(self, item):
+
+        """Show/hide the curve of a dataset when its table checkbox is toggled"""
+
+        key = item.text()
+        if item.column() != 0 or key not in self.plotVisDict:
+            return
+        visible = item.checkState() == Qt.Checked
+        if visible == self.currentState[key]:
+            return
+        self.currentState[key] = visible
+        self.plotVisDict[key].setVisible(visible)
+        for item in self.envelopes.get(key, ([], []))[0]:
+            item.setVisible(visible)
+        for curve in self.trackCurves.get(key, []):
+            curve.setVisible(visible)
+        if visible:
+            # hidden curves are not updated while the animation runs
+            self.showFrame(key)
 
-        if self.currentState:
-            try:
-                for row in range(self.tableWidget.rowCount()):
-                    key = self.tableWidget.item(row, 0).text()
-                    pen = mkPen(color = (self.plotColors[row]), width = self.plotLineWidth)
-                    if (self.tableWidget.item(row, 0).checkState() == Qt.Checked) and key not in self.plotVisDict:
-                            self.addCurve(key,pen)
-                    if self.tableWidget.item(row, 0).checkState() == Qt.Unchecked and key in self.plotVisDict:
-                        self.removeCurve(key)    
-            except Exception as e:
-                raise e
-            
 
     def selectMeasurement(self):
 
         """Plot formatting for selected measurement"""
 
-        if self.comboBoxMeasurement.currentIndex() == 0:
-            print("FFT")
-            self.rescalePlot(0.53,1.25,0,-170,-90,0)
-            self.livePlot.setLabel('left', 'Transmission Intensity (dB)')
-            self.livePlot.setLabel('bottom', 'Frequency (THz)')
-            self.livePlot.setTitle("""Transmission FFT""", color = 'g', size = "45 pt")   
-
-        elif self.comboBoxMeasurement.currentIndex() == 1:
-            print("TR")
-            self.rescalePlot(0.45,1.55,0,0.35,3,0)
-            self.livePlot.setLabel('left', 'Transmission Ratio')
-            self.livePlot.setLabel('bottom', 'Frequency (THz)')
-            self.livePlot.setTitle("""Transmission Ratio""", color = 'r', size = "45 pt")   
-        elif self.comboBoxMeasurement.currentIndex() == 2:
-            print("TDS")    
-            self.rescalePlot(10,50,0,-1.65,1.25,0)        
-            self.livePlot.setLabel('left', 'Signal (mV)')
-            self.livePlot.setLabel('bottom', 'Time (ps)')
-            self.livePlot.setTitle("""THz - TDS""", color = 'y', size = "45 pt") 
-        elif self.comboBoxMeasurement.currentIndex() == 3:
-            print("PD")    
-            self.rescalePlot(0.2,2,0,-2,2,0)        
-            self.livePlot.setLabel('left', 'Phase difference (rad)')
-            self.livePlot.setLabel('bottom', 'Frequency (THz)')
-            self.livePlot.setTitle("""THz - Unwrapped Phase difference""", color = (255,20,147), size = "45 pt") 
+        self.xKey, self.yKey = self.measurementKeys[self.comboBoxMeasurement.currentText()]
+        self.invalidateDisplayCache()
+        print(self.comboBoxMeasurement.currentText())
+        self.formatPlot(self.livePlot, self.comboBoxMeasurement.currentText())
+        self.updateMap()
+        self.updateEnvelopes()
+        self.updateTracks()
 
         
+    @classmethod
+    def formatPlot(cls, plot, measurement):
+
+        """Axis ranges, labels and title of a measurement on a PlotWidget"""
+
+        (x1, x2, y1, y2), left, bottom, title, color = cls.measurementStyles[measurement]
+        plot.setXRange(x1, x2, padding = 0)
+        plot.setYRange(y1, y2, padding = 0)
+        plot.setLabel('left', left)
+        plot.setLabel('bottom', bottom)
+        plot.setTitle(title, color = color, size = "45 pt")
+
+
     def validateEditSpeed(self):
 
         """Validate speed user input"""
@@ -432,10 +1307,13 @@ class PolDataViewerWindow(QMainWindow):
                                    60)[0] == QValidator.Acceptable:
             print("Speed input accepted")
             self.speed = round(1/int(self.lEditSpeed.text())*1000)
+            # only a running animation is restarted, at launch it waits for data
+            running = self.animationTimer.isActive()
             self.animationTimer.stop()
             print(f"Speed = {self.speed}")
             self.animationTimer.setInterval(self.speed)
-            self.animationTimer.start()
+            if running:
+                self.animationTimer.start()
         else:
             print("Invalid speed Input")
 
@@ -459,7 +1337,7 @@ class PolDataViewerWindow(QMainWindow):
             self.lEditPhi.setText(str(self.phi))
         if self.plotVisDict and self.btnPlay.isChecked():
             key = list(self.plotVisDict.keys())[0]
-            self.phi_idx = self.analyser.ml.find_nearest(self.analyser.dfDict[key]['phi'], self.phi)[0]
+            self.phi_idx = self.analyser.ml.find_nearest(self.analyser.dfDict[key].phi, self.phi)[0]
             self.refreshPlot()
     
     def mouseMoved(self, evt):
@@ -482,9 +1360,34 @@ if __name__ =="__main__":
 
     try:
 
-        app = QApplication(sys.argv)
-        win = PolDataViewerWindow('../config/polDataViewerConfig.yml')
+        parser = argparse.ArgumentParser(description = "THEA phi scan data viewer")
+        parser.add_argument('--lazy', action = 'store_true',
+                            help = "memory-map datasets and page in frames on demand")
+        parser.add_argument('--memory-budget', type = int, default = 256,
+                            help = "resident memory budget in MiB for frames in lazy mode")
+        parser.add_argument('--trace', default = None, metavar = 'FILE',
+                            help = "export stage timings as JSON to FILE on shutdown")
+        parser.add_argument('--precision', choices = ('double', 'single'), default = 'double',
+                            help = "storage precision of spectra and results")
+        parser.add_argument('--resolution', type = float, default = None, metavar = 'THZ',
+                            help = "target frequency resolution, picks the zero-padded length instead of 16384")
+        parser.add_argument('--store-band', type = float, nargs = 2, default = None, metavar = ('F0', 'F1'),
+                            help = "THz band of the stored spectra, all bins by default")
+        parser.add_argument('--live', default = None, metavar = 'DIR',
+                            help = "follow the Menlo traces written to an acquisition directory")
+        parser.add_argument('--startup-time', action = 'store_true',
+                            help = "print the time until the window is shown and exit")
+        args, qtArgs = parser.parse_known_args()
+        app = QApplication(sys.argv[:1] + qtArgs)
+        win = PolDataViewerWindow('../config/polDataViewerConfig.yml', args.lazy, args.memory_budget, args.precision)
+        win.traceFile = args.trace
+        win.analyser.ml.set_processing_params(dict(win.analyser.ml.processing_params(), resolution = args.resolution,
+                                                   store_band = args.store_band))
+        if args.live:
+            win.startLive(args.live)
         win.show()
+        # runs once the events of the first show are processed
+        QTimer.singleShot(0, lambda: win.reportStartup(args.startup_time))
         app.exec()
     except Exception as e:
         raise e
\ No newline at end of file
@@ -0,0 +1,301 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import numpy as np
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+from PhiScanDataModel import Analyser, PhiScan
+
+try:
+    import h5py
+except ImportError:         # HDF5 export is optional
+    h5py = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:         # Parquet export is optional
+    pa = pq = None
+
+
+# exported quantities grouped by the PhiScan attribute holding their x axis
+AXES = {'freq': ('FFT', 'c_FFT', 'TR', 'c_tr'), 'p_freq': ('phase', 'slc_FFT'),
+        'pd_freq': ('pd',), 'time': ('amp',)}
+
+
+def requires(module, name):
+
+    if module is None:
+        raise ImportError(f"{name} is needed for this export format, install it with pip install {name}")
+
+
+def metaColumns(scan):
+
+    """Per angle metadata of a scan (phi, design, sensor_id, Datetime, ...) as numpy columns"""
+
+    cols = {'phi': np.asarray(scan.phi, dtype = float)}
+    for key, val in scan.meta.items():
+        val = np.asarray(val)
+        if val.ndim != 1 or len(val) != len(scan):
+            continue
+        if val.dtype.kind in 'MmOUS':
+            val = np.array([str(v) for v in val])
+        cols[key] = val
+    return cols
+
+
+def blocks(analyser, key, chunk):
+
+    """Yield (rows, {quantity: (n, n_bins) block}) of a dataset, chunk angles at a time.
+
+        Sample quantities are taken from the scan or, for lazily opened scans,
+        computed per chunk against the reference, so memory-mapped datasets
+        are never loaded whole.
+    """
+
+    scan = analyser.dfDict[key]
+    computeSamples = scan.TR is None and analyser.referenceDF is not None and key != analyser.referenceKey
+    for start in range(0, len(scan), chunk):
+        rows = slice(start, min(start + chunk, len(scan)))
+        block = {}
+        for quantities in AXES.values():
+            for q in quantities:
+                if getattr(scan, q) is not None:
+                    block[q] = np.asarray(getattr(scan, q)[rows])
+        if computeSamples:
+            res = analyser.sample_results(scan, analyser.referenceDF, rows)
+            block.update({q: res[q] for q in scan.samples if q != 'pd_freq'})
+        yield rows, block
+
+
+def axes(analyser, key):
+
+    """x axis of every exported axis group of a dataset, None where it does not exist"""
+
+    scan = analyser.dfDict[key]
+    res = {a: getattr(scan, a) for a in AXES}
+    if res['pd_freq'] is None and scan.TR is None and analyser.referenceDF is not None:
+        res['pd_freq'] = analyser.sample_results(scan, analyser.referenceDF, slice(0, 1))['pd_freq']
+    if res['time'] is not None and res['time'].ndim > 1:
+        res['time'] = res['time'][0]
+    return res
+
+
+def export_hdf5(analyser, path, keys = None, chunk = 32, bins = 1024, compression = 'gzip'):
+
+    """Write the datasets of an Analyser to an HDF5 file.
+
+        Every dataset is a group holding the 1D axes, the per angle metadata
+        and one (n_phi, n_bins) array per quantity, chunked chunk angles by
+        bins bins and compressed, so read_hdf5 only touches the chunks of
+        the requested angle range and band.
+
+        *Arguments*
+
+        keys : dataset keys to export, all by default
+        chunk, bins : chunk shape of the quantity arrays
+        compression : h5py filter, 'gzip' or 'lzf'
+    """
+
+    requires(h5py, 'h5py')
+    with h5py.File(path, 'w') as f:
+        f.attrs['processing'] = json.dumps(analyser.ml.processing_params())
+        f.attrs['reference'] = analyser.referenceKey or ''
+        for key in keys or list(analyser.dfDict):
+            g = f.create_group(key)
+            n = len(analyser.dfDict[key])
+            for name, val in axes(analyser, key).items():
+                if val is not None:
+                    g.create_dataset(name, data = np.asarray(val))
+            m = g.create_group('meta')
+            for name, val in metaColumns(analyser.dfDict[key]).items():
+                if val.dtype.kind == 'U':
+                    m.create_dataset(name, data = val.astype(object), dtype = h5py.string_dtype())
+                else:
+                    m.create_dataset(name, data = val)
+            for rows, block in blocks(analyser, key, chunk):
+                for q, val in block.items():
+                    if q not in g:
+                        axisKey = next(a for a, qs in AXES.items() if q in qs)
+                        ds = g.create_dataset(q, shape = (n, val.shape[1]), dtype = val.dtype,
+                                              chunks = (min(chunk, n), min(bins, val.shape[1])),
+                                              compression = compression, shuffle = True)
+                        ds.attrs['axis'] = axisKey
+                    g[q][rows] = val
+
+
+def selection(phi, axis, phiRange, band):
+
+    """Contiguous row and column slices covering phiRange and band, and the row mask within them"""
+
+    mask = np.ones(len(phi), dtype = bool) if phiRange is None else \
+           (phi >= min(phiRange)) & (phi <= max(phiRange))
+    idx = np.flatnonzero(mask)
+    rows = slice(idx[0], idx[-1] + 1) if len(idx) else slice(0, 0)
+    cols = slice(None) if band is None else \
+           slice(int(np.searchsorted(axis, band[0])), int(np.searchsorted(axis, band[1], side = 'right')))
+    return rows, cols, mask[rows]
+
+
+def read_hdf5(path, key, quantity, phi = None, band = None):
+
+    """Read one quantity of a dataset from an export_hdf5 file, optionally in part.
+
+        *Arguments*
+
+        phi : optional (start, stop) angle range in deg
+        band : optional (f0, f1) range of the x axis (THz, or ps for 'amp')
+
+        *Returns*
+
+        (axis, phi, values) with values of shape (len(phi), len(axis))
+    """
+
+    requires(h5py, 'h5py')
+    with h5py.File(path, 'r') as f:
+        g = f[key]
+        ds = g[quantity]
+        axis = g[ds.attrs['axis']][:]
+        angles = g['meta/phi'][:]
+        rows, cols, keep = selection(angles, axis, phi, band)
+        return axis[cols], angles[rows][keep], ds[rows, cols][keep]
+
+
+def read_hdf5_meta(path, key):
+
+    """Per angle metadata of a dataset from an export_hdf5 file"""
+
+    requires(h5py, 'h5py')
+    with h5py.File(path, 'r') as f:
+        return {name: ds.asstr()[:] if h5py.check_string_dtype(ds.dtype) else ds[:]
+                for name, ds in f[key]['meta'].items()}
+
+
+def export_parquet(analyser, directory, keys = None, chunk = 32, compression = 'zstd'):
+
+    """Write the datasets of an Analyser as Parquet files in long format.
+
+        Every dataset gets a directory with meta.parquet (one row per angle)
+        and one <axis>.parquet per axis group with a row per (angle, bin) and
+        a column per quantity, complex ones split into _re and _im. Each row
+        group holds chunk angles, so filters on phi and on the axis column
+        skip the row groups and pages outside the requested range.
+    """
+
+    requires(pq, 'pyarrow')
+    for key in keys or list(analyser.dfDict):
+        out = os.path.join(directory, key)
+        os.makedirs(out, exist_ok = True)
+        cols = metaColumns(analyser.dfDict[key])
+        pq.write_table(pa.table(cols), os.path.join(out, 'meta.parquet'), compression = compression)
+        x = axes(analyser, key)
+        phi = cols['phi']
+        writers = {}
+        try:
+            for rows, block in blocks(analyser, key, chunk):
+                for axisKey, quantities in AXES.items():
+                    qs = [q for q in quantities if q in block]
+                    if not qs or x[axisKey] is None:
+                        continue
+                    nr, nb = len(phi[rows]), len(x[axisKey])
+                    table = {'phi_idx': np.repeat(np.arange(rows.start, rows.stop, dtype = np.int32), nb),
+                             'phi': np.repeat(phi[rows], nb), axisKey: np.tile(x[axisKey], nr)}
+                    for q in qs:
+                        val = block[q].ravel()
+                        if np.iscomplexobj(val):
+                            table[q + '_re'], table[q + '_im'] = val.real, val.imag
+                        else:
+                            table[q] = val
+                    table = pa.table(table)
+                    if axisKey not in writers:
+                        writers[axisKey] = pq.ParquetWriter(os.path.join(out, axisKey + '.parquet'),
+                                                            table.schema, compression = compression)
+                    writers[axisKey].write_table(table, row_group_size = len(table))
+        finally:
+            for w in writers.values():
+                w.close()
+    with open(os.path.join(directory, 'processing.json'), 'w') as f:
+        json.dump({'processing': analyser.ml.processing_params(), 'reference': analyser.referenceKey}, f, indent = 2)
+
+
+def read_parquet(directory, key, quantity, phi = None, band = None):
+
+    """Read one quantity of a dataset from an export_parquet directory, optionally in part.
+
+        Same arguments and result as read_hdf5.
+    """
+
+    requires(pq, 'pyarrow')
+    axisKey = next(a for a, qs in AXES.items() if quantity in qs)
+    path = os.path.join(directory, key, axisKey + '.parquet')
+    names = pq.ParquetFile(path).schema_arrow.names
+    columns = [c for c in (quantity, quantity + '_re', quantity + '_im') if c in names]
+    filters = []
+    if phi is not None:
+        filters += [('phi', '>=', min(phi)), ('phi', '<=', max(phi))]
+    if band is not None:
+        filters += [(axisKey, '>=', band[0]), (axisKey, '<=', band[1])]
+    table = pq.read_table(path, columns = ['phi_idx', 'phi', axisKey] + columns, filters = filters or None)
+    idx = table.column('phi_idx').to_numpy()
+    nr = len(np.unique(idx))
+    axis = table.column(axisKey).to_numpy()[:len(idx)//max(nr, 1)]
+    values = [table.column(c).to_numpy() for c in columns]
+    values = values[0] if len(values) == 1 else values[0] + 1j*values[1]
+    return axis, table.column('phi').to_numpy()[::max(len(axis), 1)], values.reshape(nr, len(axis))
+
+
+def export_resonances(analyser, path, yKey = 'TR', band = (0.5, 1.5), mode = 'min', keys = None):
+
+    """Write the resonance tracked at every angle of the datasets as CSV.
+
+        One row per (dataset, angle) with the fitted frequency (THz), the
+        extremum value, depth and full width at half depth (THz), see
+        Analyser.resonances. Datasets without yKey are left out.
+
+        *Returns*
+
+        keys of the exported datasets
+    """
+
+    exported = []
+    with open(path, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(['dataset', 'phi', 'freq', 'value', 'depth', 'width'])
+        for key in keys or list(analyser.dfDict):
+            res = analyser.resonances(key, yKey, band, mode)
+            if res is None:
+                continue
+            for row in zip(res['phi'], res['freq'], res['value'], res['depth'], res['width']):
+                writer.writerow([key] + [f"{v:.6g}" for v in row])
+            exported.append(key)
+    return exported
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Export processed PhiScans to chunked, compressed HDF5 or Parquet")
+    parser.add_argument('files', nargs = '+', help = "PhiScanBatch .npz results")
+    parser.add_argument('-o', '--out', required = True, help = "output .h5 file, directory for Parquet, or .csv")
+    parser.add_argument('--format', choices = ('hdf5', 'parquet'), default = 'hdf5')
+    parser.add_argument('--chunk', type = int, default = 32, help = "angles per chunk / row group")
+    parser.add_argument('--resonance', type = float, nargs = 2, default = None, metavar = ('F0', 'F1'),
+                        help = "write the resonance tracked in this THz band as CSV instead")
+    parser.add_argument('--quantity', choices = tuple(Analyser.trackKeys), default = 'TR',
+                        help = "quantity the resonance is tracked in")
+    parser.add_argument('--peaks', action = 'store_true', help = "track peaks instead of dips")
+    args = parser.parse_args()
+
+    analyser = Analyser()
+    for f in args.files:
+        analyser.add_scan(os.path.splitext(os.path.basename(f))[0], PhiScan.load(f))
+    if args.resonance:
+        export_resonances(analyser, args.out, args.quantity, args.resonance, 'max' if args.peaks else 'min')
+    elif args.format == 'hdf5':
+        export_hdf5(analyser, args.out, chunk = args.chunk)
+    else:
+        export_parquet(analyser, args.out, chunk = args.chunk)
+    print(f"Exported {len(analyser.dfDict)} datasets to {args.out}")
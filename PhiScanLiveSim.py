@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import argparse
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+from PhiScanBenchmark import synthScan, writeMenloTrace
+
+
+def simulate(dirname, n_phi = 360, n_samples = 2000, rate = 10.0, rotations = 1, seed = 0, prefix = 'C1'):
+
+    """Write the traces of a synthetic phi scan to dirname one at a time, like the instrument.
+
+        Every trace is written under a temporary name and renamed into place,
+        so a watcher never sees a partially written .txt file.
+
+        *Arguments*
+
+        rate : traces per second, 0 writes them as fast as possible
+        rotations : number of times the scan is repeated
+    """
+
+    os.makedirs(dirname, exist_ok = True)
+    phi, t, amp = synthScan(n_phi, n_samples, seed = seed)
+    for i in range(n_phi*rotations):
+        start = time.perf_counter()
+        path = os.path.join(dirname, f"{prefix}_{i:05d}.txt")
+        writeMenloTrace(path[:-4] + '.part', i, t, amp[i % n_phi])
+        os.replace(path[:-4] + '.part', path)
+        if rate > 0:
+            time.sleep(max(0, 1/rate - (time.perf_counter() - start)))
+    return n_phi*rotations
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Stand-in for the instrument: write Menlo traces of a synthetic phi scan for the viewer's live mode")
+    parser.add_argument('dir', help = "acquisition directory, as passed to PhiScanDataViewer.py --live")
+    parser.add_argument('--angles', type = int, default = 360)
+    parser.add_argument('--samples', type = int, default = 2000, help = "samples per TDS trace")
+    parser.add_argument('--rate', type = float, default = 10, help = "traces per second, 0 for no delay")
+    parser.add_argument('--rotations', type = int, default = 1)
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    n = simulate(args.dir, args.angles, args.samples, args.rate, args.rotations, args.seed)
+    print(f"Wrote {n} traces to {args.dir}")
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:         # not available on Windows
+    resource = None
+
+
+class Profiler():
+
+    """Stage timers, counters and memory snapshots shared by loader, analyser and viewer.
+
+        Stages are recorded as complete events that export to the Chrome trace
+        format (chrome://tracing, Perfetto) together with per stage totals.
+        Set PHISCAN_PROFILE=0 to disable recording.
+    """
+
+    def __init__(self, maxEvents = 100000):
+
+        self.enabled = os.environ.get('PHISCAN_PROFILE', '1') != '0'
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.maxEvents = maxEvents
+        self.reset()
+
+
+    def reset(self):
+
+        with self.lock:
+            self.stages = {}            # name -> [calls, total s, max s]
+            self.counters = {}
+            self.snapshots = []
+            self.events = deque(maxlen = self.maxEvents)
+
+
+    @contextmanager
+    def stage(self, name, **args):
+
+        """Time the enclosed block as stage name"""
+
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start, args)
+
+
+    def timed(self, name):
+
+        """Decorator timing every call of a function as stage name"""
+
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+    def record(self, name, start, duration, args = None):
+
+        """Add a stage that started at perf_counter start and lasted duration seconds"""
+
+        if not self.enabled:
+            return
+        with self.lock:
+            stat = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+            self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(),
+                                'tid': threading.get_ident(),
+                                'ts': (start - self.t0)*1e6, 'dur': duration*1e6,
+                                'args': args or {}})
+
+
+    def count(self, name, n = 1):
+
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def snapshot(self, label):
+
+        """Record the current memory use: traced Python heap if tracemalloc runs, peak RSS if known"""
+
+        if not self.enabled:
+            return
+        snap = {'label': label, 'ts': (time.perf_counter() - self.t0)*1e6}
+        if tracemalloc.is_tracing():
+            snap['traced_MiB'], snap['traced_peak_MiB'] = [m/2**20 for m in tracemalloc.get_traced_memory()]
+        if resource is not None:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            snap['max_rss_MiB'] = rss/2**20 if sys.platform == 'darwin' else rss/2**10
+        with self.lock:
+            self.snapshots.append(snap)
+            self.events.append({'name': label, 'ph': 'C', 'pid': os.getpid(), 'ts': snap['ts'],
+                                'args': {k: v for k, v in snap.items() if k.endswith('MiB')}})
+
+
+    def summary(self):
+
+        """Per stage calls, total, mean and max time in ms"""
+
+        with self.lock:
+            return {name: {'calls': n, 'total_ms': total*1e3, 'mean_ms': total/n*1e3, 'max_ms': mx*1e3}
+                    for name, (n, total, mx) in self.stages.items()}
+
+
+    def report(self):
+
+        """Printable table of the stage summary"""
+
+        lines = [f"{'stage':<28}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for name, s in sorted(self.summary().items(), key = lambda i: -i[1]['total_ms']):
+            lines.append(f"{name:<28}{s['calls']:>8}{s['total_ms']:>12.1f}{s['mean_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<28}{n:>8}")
+        return "\n".join(lines)
+
+
+    def export(self, path):
+
+        """Write the trace, stage summary, counters and machine description as JSON"""
+
+        import numpy as np
+        with self.lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            snapshots = list(self.snapshots)
+        data = {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'summary': self.summary(), 'counters': counters, 'snapshots': snapshots,
+                'machine': {'platform': platform.platform(), 'processor': platform.processor(),
+                            'cpus': os.cpu_count(), 'python': platform.python_version(),
+                            'numpy': np.__version__}}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+# shared instance used across the package
+profiler = Profiler()
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+baseDir =  os.path.dirname(os.path.abspath(__file__))
+sys.path.append(baseDir)
+
+
+_renderer = None        # per worker (app, plot, curves, frames) set up by initRenderer
+
+
+def renderSpec(files, reference = None, measurement = 'FFT', colors = None, visible = None,
+               xRange = None, yRange = None, waterLines = False, size = (1280, 720),
+               params = None, cacheDir = None):
+
+    """Description of an animation that worker processes can rebuild on their own.
+
+        *Arguments*
+
+        files : dict of dataset key -> .pkl or .npz file, the reference included
+        reference : key of the reference dataset
+        measurement : 'FFT', 'TR', 'TDS' or 'PD'
+        colors : dict of key -> (r, g, b[, a]), the viewer palette by default
+        visible : keys of the plotted datasets, all by default
+        xRange, yRange : axis ranges, the viewer presets of the measurement by default
+        waterLines : overlay the water absorption lines
+        size : frame size in pixels
+        params : MenloLoader processing parameters, the defaults if None
+        cacheDir : ScanCache directory shared with the viewer, to skip reprocessing
+    """
+
+    return {'files': dict(files), 'reference': reference, 'measurement': measurement,
+            'colors': colors, 'visible': list(files) if visible is None else list(visible),
+            'xRange': xRange, 'yRange': yRange, 'waterLines': waterLines, 'size': tuple(size),
+            'params': params, 'cacheDir': cacheDir}
+
+
+def initRenderer(spec):
+
+    """Load the datasets and build the offscreen plot once per worker process"""
+
+    global _renderer
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import Qt, QPointF
+    import pyqtgraph as pg
+    from PhiScanDataModel import Analyser, PhiScan
+    from PhiScanCache import ScanCache
+    from PhiScanDataViewer import PolDataViewerWindow, LoaderTask, decimateCurve, displayValues, rainbow
+
+    app = QApplication.instance() or QApplication([])
+    params = spec['params']
+    analyser = Analyser(ScanCache(spec['cacheDir']) if spec['cacheDir'] else None,
+                        precision = params['precision'] if params else 'double')
+    if params:
+        analyser.ml.set_processing_params(params)
+    for key, f in spec['files'].items():
+        scan = PhiScan.load(f) if f.endswith('.npz') else analyser.loadScan(f, LoaderTask.phi_vals)
+        analyser.add_scan(key, scan)
+    if spec['reference']:
+        analyser.set_reference(spec['reference'])
+        analyser.update_samples()
+
+    measurement = spec['measurement']
+    xKey, yKey = PolDataViewerWindow.measurementKeys[measurement]
+    plot = pg.PlotWidget()
+    plot.resize(*spec['size'])
+    plot.showGrid(x = True, y = True)
+    PolDataViewerWindow.formatPlot(plot, measurement)
+    if spec['xRange']:
+        plot.setXRange(*spec['xRange'], padding = 0)
+    if spec['yRange']:
+        plot.setYRange(*spec['yRange'], padding = 0)
+    if spec['waterLines']:
+        for peak in PolDataViewerWindow.water_peaks:
+            plot.addItem(pg.InfiniteLine(pos = peak, pen = pg.mkPen((100,100,0,180), width = 2, style = Qt.DashLine)))
+    label = pg.TextItem('', color = '#FFF')
+    plot.addItem(label)
+    plot.show()         # invisible on the offscreen platform, lays out the widget
+    app.processEvents()
+
+    keys = list(analyser.dfDict)
+    colors = spec['colors'] or {}
+    palette = rainbow(np.linspace(0, 1, len(keys)))
+    curves, data = {}, {}
+    for i, key in enumerate(spec['visible']):
+        scan = analyser.dfDict[key]
+        yData = getattr(scan, yKey)
+        if yData is None:
+            continue
+        color = colors.get(key) or tuple(int(round(c)) for c in palette[keys.index(key)])
+        curves[key] = plot.plot(pen = pg.mkPen(color = color, width = 1.5))
+        data[key] = (getattr(scan, xKey), displayValues(yKey, yData), scan.phi)
+    _renderer = {'app': app, 'plot': plot, 'label': label, 'curves': curves, 'data': data,
+                 'decimate': decimateCurve, 'QPointF': QPointF}
+
+
+def renderFrames(frames, outDir):
+
+    """Render the angle indices frames to outDir/frame_<index>.png, returns the written paths"""
+
+    r = _renderer
+    viewBox = r['plot'].getViewBox()
+    (x0, x1), (y0, y1) = viewBox.viewRange()
+    r['label'].setPos(r['QPointF'](x0 + 0.8*(x1 - x0), y0 + 0.95*(y1 - y0)))
+    paths = []
+    for idx in frames:
+        phi = None
+        for key, curve in r['curves'].items():
+            xData, yData, angles = r['data'][key]
+            if idx >= len(yData):
+                curve.setData([], [])
+                continue
+            x = xData if xData.ndim == 1 else xData[idx]
+            curve.setData(*r['decimate'](x, yData[idx], x0, x1, viewBox.width() or 1000))
+            phi = angles[idx] if phi is None else phi
+        if phi is not None:
+            r['label'].setText(f"Data: {idx}/360\nPhi: {phi:.2f} deg")
+        r['app'].processEvents()
+        path = os.path.join(outDir, f"frame_{idx:04d}.png")
+        r['plot'].grab().save(path)
+        paths.append(path)
+    return paths
+
+
+def stitch(outDir, output, fps):
+
+    """Encode the frames of outDir to a video with ffmpeg.
+
+        *Returns*
+
+        output, or None if ffmpeg is not available and the image sequence is kept
+    """
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return None
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(outDir, 'frame_%04d.png'),
+                    '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                    output], check = True)
+    return output
+
+
+def render(spec, output, frames = 360, fps = 25, workers = None, progress = None):
+
+    """Render an animation described by renderSpec on worker processes without a window.
+
+        Frames are split into contiguous blocks across workers. A video output
+        (.mp4, .mkv, .avi, .mov, .webm) is encoded with ffmpeg from the frames
+        written next to it, any other output is a directory for the PNG sequence.
+
+        *Arguments*
+
+        progress : optional callable receiving (done, total) frames
+
+        *Returns*
+
+        path of the video, or of the image sequence directory
+    """
+
+    t0 = time.perf_counter()
+    video = output.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.webm'))
+    outDir = os.path.splitext(output)[0] + '_frames' if video else output
+    os.makedirs(outDir, exist_ok = True)
+    workers = workers or os.cpu_count() or 1
+    blocks = [b for b in np.array_split(np.arange(frames), 4*workers) if len(b)]
+    done = 0
+    # spawn, as forked Qt state of a running viewer is not usable in the workers
+    with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context('spawn'),
+                             initializer = initRenderer, initargs = (spec,)) as pool:
+        jobs = [pool.submit(renderFrames, b.tolist(), outDir) for b in blocks]
+        for job in as_completed(jobs):
+            done += len(job.result())
+            if progress is not None:
+                progress(done, frames)
+    result = outDir
+    if video:
+        if stitch(outDir, output, fps):
+            shutil.rmtree(outDir)
+            result = output
+        else:
+            print("ffmpeg not found, keeping the image sequence")
+    print(f"Rendered {frames} frames in {time.perf_counter() - t0:.1f} s -> {result}")
+    return result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Render a phi scan animation offscreen to a video or PNG sequence")
+    parser.add_argument('files', nargs = '+', help = "PhiScan .pkl files or PhiScanBatch .npz results")
+    parser.add_argument('-r', '--reference', default = None, help = "file of the reference dataset")
+    parser.add_argument('-m', '--measurement', choices = ('FFT', 'TR', 'TDS', 'PD'), default = 'FFT')
+    parser.add_argument('-o', '--out', default = 'phiscan.mp4', help = "video file, or directory for PNG frames")
+    parser.add_argument('-j', '--workers', type = int, default = None, help = "worker processes, all cores by default")
+    parser.add_argument('--frames', type = int, default = 360)
+    parser.add_argument('--fps', type = int, default = 25)
+    parser.add_argument('--size', type = int, nargs = 2, default = (1280, 720), metavar = ('W', 'H'))
+    parser.add_argument('--x-range', type = float, nargs = 2, default = None, metavar = ('X0', 'X1'))
+    parser.add_argument('--y-range', type = float, nargs = 2, default = None, metavar = ('Y0', 'Y1'))
+    parser.add_argument('--water-lines', action = 'store_true')
+    parser.add_argument('--cache', default = None, help = "ScanCache directory to reuse processed spectra")
+    args = parser.parse_args()
+
+    datasetKey = lambda f: os.path.splitext(os.path.basename(f))[0].split("_")[0]
+    files = {datasetKey(f): os.path.abspath(f) for f in args.files + ([args.reference] if args.reference else [])}
+    spec = renderSpec(files, datasetKey(args.reference) if args.reference else None, args.measurement,
+                      visible = [datasetKey(f) for f in args.files], xRange = args.x_range,
+                      yRange = args.y_range, waterLines = args.water_lines, size = args.size,
+                      cacheDir = args.cache)
+    render(spec, args.out, args.frames, args.fps, args.workers)
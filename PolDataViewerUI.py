@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'PolDataViewerUI.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(986, 630)
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        self.centralwidget.setObjectName("centralwidget")
+        self.gLivePlot = QtWidgets.QGroupBox(self.centralwidget)
+        self.gLivePlot.setGeometry(QtCore.QRect(30, 110, 541, 431))
+        self.gLivePlot.setObjectName("gLivePlot")
+        self.livePlot = PlotWidget(self.gLivePlot)
+        self.livePlot.setGeometry(QtCore.QRect(30, 30, 501, 381))
+        self.livePlot.setObjectName("livePlot")
+        self.xyLabel = QtWidgets.QLabel(self.gLivePlot)
+        self.xyLabel.setGeometry(QtCore.QRect(30, 410, 191, 16))
+        self.xyLabel.setObjectName("xyLabel")
+        self.tableWidget = QtWidgets.QTableWidget(self.centralwidget)
+        self.tableWidget.setGeometry(QtCore.QRect(580, 120, 391, 421))
+        self.tableWidget.setObjectName("tableWidget")
+        self.tableWidget.setColumnCount(3)
+        self.tableWidget.setRowCount(0)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidget.setHorizontalHeaderItem(0, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidget.setHorizontalHeaderItem(1, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidget.setHorizontalHeaderItem(2, item)
+        self.label = QtWidgets.QLabel(self.centralwidget)
+        self.label.setGeometry(QtCore.QRect(760, 60, 201, 31))
+        font = QtGui.QFont()
+        font.setFamily("Corbel Light")
+        font.setPointSize(18)
+        self.label.setFont(font)
+        self.label.setLineWidth(1)
+        self.label.setObjectName("label")
+        self.label_2 = QtWidgets.QLabel(self.centralwidget)
+        self.label_2.setGeometry(QtCore.QRect(880, 20, 81, 31))
+        font = QtGui.QFont()
+        font.setFamily("Century Gothic")
+        font.setPointSize(22)
+        self.label_2.setFont(font)
+        self.label_2.setLineWidth(1)
+        self.label_2.setObjectName("label_2")
+        self.layoutWidget = QtWidgets.QWidget(self.centralwidget)
+        self.layoutWidget.setGeometry(QtCore.QRect(40, 560, 510, 26))
+        self.layoutWidget.setObjectName("layoutWidget")
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout(self.layoutWidget)
+        self.horizontalLayout_2.setContentsMargins(0, 0, 0, 0)
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.btnPlay = QtWidgets.QPushButton(self.layoutWidget)
+        self.btnPlay.setObjectName("btnPlay")
+        self.horizontalLayout_2.addWidget(self.btnPlay)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.horizontalLayout_3 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_3.setObjectName("horizontalLayout_3")
+        self.comboBoxMeasurement = QtWidgets.QComboBox(self.layoutWidget)
+        self.comboBoxMeasurement.setObjectName("comboBoxMeasurement")
+        self.comboBoxMeasurement.addItem("")
+        self.comboBoxMeasurement.addItem("")
+        self.comboBoxMeasurement.addItem("")
+        self.comboBoxMeasurement.addItem("")
+        self.horizontalLayout_3.addWidget(self.comboBoxMeasurement)
+        self.horizontalLayout.addLayout(self.horizontalLayout_3)
+        self.horizontalLayout_2.addLayout(self.horizontalLayout)
+        self.horizontalLayout_6 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_6.setObjectName("horizontalLayout_6")
+        self.horizontalLayout_5 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_5.setObjectName("horizontalLayout_5")
+        self.checkBoxWaterLines = QtWidgets.QCheckBox(self.layoutWidget)
+        self.checkBoxWaterLines.setObjectName("checkBoxWaterLines")
+        self.horizontalLayout_5.addWidget(self.checkBoxWaterLines)
+        self.checkBoxFps = QtWidgets.QCheckBox(self.layoutWidget)
+        self.checkBoxFps.setObjectName("checkBoxFps")
+        self.horizontalLayout_5.addWidget(self.checkBoxFps)
+        self.checkBoxMap = QtWidgets.QCheckBox(self.layoutWidget)
+        self.checkBoxMap.setObjectName("checkBoxMap")
+        self.horizontalLayout_5.addWidget(self.checkBoxMap)
+        self.checkBoxStats = QtWidgets.QCheckBox(self.layoutWidget)
+        self.checkBoxStats.setObjectName("checkBoxStats")
+        self.horizontalLayout_5.addWidget(self.checkBoxStats)
+        self.checkBoxTrack = QtWidgets.QCheckBox(self.layoutWidget)
+        self.checkBoxTrack.setObjectName("checkBoxTrack")
+        self.horizontalLayout_5.addWidget(self.checkBoxTrack)
+        self.lblSpeed = QtWidgets.QLabel(self.layoutWidget)
+        self.lblSpeed.setObjectName("lblSpeed")
+        self.horizontalLayout_5.addWidget(self.lblSpeed)
+        self.lEditSpeed = QtWidgets.QLineEdit(self.layoutWidget)
+        self.lEditSpeed.setObjectName("lEditSpeed")
+        self.horizontalLayout_5.addWidget(self.lEditSpeed)
+        self.horizontalLayout_6.addLayout(self.horizontalLayout_5)
+        self.horizontalLayout_4 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_4.setObjectName("horizontalLayout_4")
+        self.lblAngle1 = QtWidgets.QLabel(self.layoutWidget)
+        self.lblAngle1.setObjectName("lblAngle1")
+        self.horizontalLayout_4.addWidget(self.lblAngle1)
+        self.lEditPhi = QtWidgets.QLineEdit(self.layoutWidget)
+        self.lEditPhi.setObjectName("lEditPhi")
+        self.horizontalLayout_4.addWidget(self.lEditPhi)
+        self.horizontalLayout_6.addLayout(self.horizontalLayout_4)
+        self.horizontalLayout_2.addLayout(self.horizontalLayout_6)
+        self.lblStatus = QtWidgets.QLabel(self.centralwidget)
+        self.lblStatus.setGeometry(QtCore.QRect(870, 560, 91, 20))
+        self.lblStatus.setObjectName("lblStatus")
+        MainWindow.setCentralWidget(self.centralwidget)
+        self.statusbar = QtWidgets.QStatusBar(MainWindow)
+        self.statusbar.setObjectName("statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+
+        self.retranslateUi(MainWindow)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
+        self.gLivePlot.setTitle(_translate("MainWindow", "THz TDS - Phi Scan Data"))
+        self.xyLabel.setText(_translate("MainWindow", "cursor position: (- , -)"))
+        item = self.tableWidget.horizontalHeaderItem(0)
+        item.setText(_translate("MainWindow", "Name"))
+        item = self.tableWidget.horizontalHeaderItem(1)
+        item.setText(_translate("MainWindow", "Type"))
+        item = self.tableWidget.horizontalHeaderItem(2)
+        item.setText(_translate("MainWindow", "Colour"))
+        self.label.setText(_translate("MainWindow", "Phi scan Data Viewer"))
+        self.label_2.setText(_translate("MainWindow", "ThEA"))
+        self.btnPlay.setText(_translate("MainWindow", "Play/ Pause"))
+        self.comboBoxMeasurement.setItemText(0, _translate("MainWindow", "FFT"))
+        self.comboBoxMeasurement.setItemText(1, _translate("MainWindow", "TR"))
+        self.comboBoxMeasurement.setItemText(2, _translate("MainWindow", "TDS"))
+        self.comboBoxMeasurement.setItemText(3, _translate("MainWindow", "PD"))
+        self.checkBoxWaterLines.setText(_translate("MainWindow", "waterLines"))
+        self.checkBoxFps.setToolTip(_translate("MainWindow", "Show actual vs. target animation fps and dropped frames"))
+        self.checkBoxFps.setText(_translate("MainWindow", "fps"))
+        self.checkBoxMap.setToolTip(_translate("MainWindow", "Show the selected dataset as a phi map, click a row to jump to its angle"))
+        self.checkBoxMap.setText(_translate("MainWindow", "map"))
+        self.checkBoxStats.setToolTip(_translate("MainWindow", "Overlay min/max and mean +/- std bands across phi of TR and PD"))
+        self.checkBoxStats.setText(_translate("MainWindow", "envelope"))
+        self.checkBoxTrack.setToolTip(_translate("MainWindow", "Track the resonance in the shaded band across phi: frequency, depth and width"))
+        self.checkBoxTrack.setText(_translate("MainWindow", "resonance"))
+        self.lblSpeed.setText(_translate("MainWindow", "speed (fps):        "))
+        self.lblAngle1.setText(_translate("MainWindow", "phi (deg):        "))
+        self.lblStatus.setText(_translate("MainWindow", "Status: Ready"))
+from pyqtgraph import PlotWidget